@@ -0,0 +1,36 @@
+'''Time attribute and item access on typed configs.
+
+Usage: python benchmarks/access.py [NUMBER]
+'''
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pynio.properties import load_block
+from tests.example_data import SimulatorFastTemplate
+
+config = load_block(SimulatorFastTemplate)
+interval = config.interval
+
+CASES = [
+    ('getattr', lambda: interval.days),
+    ('getitem', lambda: interval['days']),
+    ('getattr enum', lambda: config.log_level),
+    ('getattr method', lambda: config.update),
+    ('setattr', lambda: setattr(interval, 'days', 3)),
+    ('setitem', lambda: interval.__setitem__('days', 3)),
+    ('setattr enum', lambda: setattr(config, 'log_level', 'INFO')),
+    ('nested getattr', lambda: config.attribute.value.end),
+]
+
+
+def main(number):
+    for name, func in CASES:
+        best = min(timeit.repeat(func, number=number, repeat=7))
+        print('{:<16}{:>8.0f} ns'.format(name, best / number * 1e9))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
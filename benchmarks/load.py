@@ -0,0 +1,40 @@
+'''Time loading a template with many nested objects.
+
+Usage: python benchmarks/load.py [NUMBER]
+'''
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pynio.properties import load_block
+
+
+def nested(depth, width=4, leaves=10):
+    if depth == 0:
+        properties = {'n{}'.format(i): {'type': 'int', 'default': i}
+                      for i in range(leaves)}
+    else:
+        properties = {'o{}'.format(i): nested(depth - 1, width, leaves)
+                      for i in range(width)}
+    return {'type': 'object', 'template': properties}
+
+
+template = {'properties': {'p{}'.format(i): nested(2) for i in range(20)}}
+
+CASES = [
+    ('load', lambda: load_block(template)),
+    ('load + json', lambda: load_block(template).__basic__()),
+    ('load + one field', lambda: load_block(template).p3.o1.o2.n4),
+]
+
+
+def main(number):
+    for name, func in CASES:
+        best = min(timeit.repeat(func, number=number, repeat=5))
+        print('{:<18}{:>8.2f} ms'.format(name, best / number * 1e3))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,58 @@
+'''Bytes per object of Block, Service and properties containers.
+
+Usage: python benchmarks/memory.py [COUNT ...]
+'''
+import os
+import sys
+import tracemalloc
+from copy import deepcopy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pynio import Block, Service
+from pynio.properties import TypedDict, TypedList, load_block
+from tests.example_data import SimulatorFastTemplate
+
+TEMPLATE = load_block(SimulatorFastTemplate)
+TEMPLATE.readonly = True  # like the templates shared by instances
+
+
+def typed_block(n):
+    b = Block('b{}'.format(n), 'SimulatorFast')
+    b._template = TEMPLATE
+    b._config = deepcopy(TEMPLATE)
+    return b
+
+
+CASES = [
+    ('Block', lambda n: Block('b{}'.format(n), 'type')),
+    ('Service', lambda n: Service('s{}'.format(n))),
+    ('TypedDict', lambda n: TypedDict()),
+    ('TypedList', lambda n: TypedList(int)),
+    ('TypedEnum', lambda n: deepcopy(TEMPLATE._get_item('log_level'))),
+    ('typed Block', typed_block),
+]
+
+
+def measure(factory, count):
+    '''Average number of bytes allocated per object'''
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [factory(n) for n in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # the list holding the objects is not part of their size
+    return (after - before - sys.getsizeof(objects)) / len(objects)
+
+
+def main(counts):
+    print('{:<14}'.format('object') +
+          ''.join('{:>12}'.format(c) for c in counts))
+    for name, factory in CASES:
+        sizes = [measure(factory, c) for c in counts]
+        print('{:<14}'.format(name) +
+              ''.join('{:>12.0f}'.format(s) for s in sizes))
+
+
+if __name__ == '__main__':
+    main([int(c) for c in sys.argv[1:]] or [10000, 100000])
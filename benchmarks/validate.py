@@ -0,0 +1,57 @@
+'''Time typing the example block configs against their templates.
+
+Compares copying the template and updating it with the config (the
+generic path) with the compiled converters, one config at a time and in
+batches of configs of the same type.
+
+Usage: python benchmarks/validate.py [REPEAT]
+'''
+import os
+import sys
+import timeit
+from copy import deepcopy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pynio.properties import load_block, compile_template, validate_batch
+from tests.example_data import BlocksTemplatesAll, BlocksConfigsAll
+
+TEMPLATES = {t: load_block(v) for (t, v) in BlocksTemplatesAll.items()}
+for template in TEMPLATES.values():
+    template.readonly = True  # shared like an instance's, caches converters
+CONFIGS = [(TEMPLATES[c['type']], c) for c in BlocksConfigsAll.values()]
+BATCHES = {}
+for template, config in CONFIGS:
+    BATCHES.setdefault(id(template), (template, []))[1].append(config)
+
+
+def generic():
+    for template, config in CONFIGS:
+        typed = deepcopy(template)
+        typed.update(config, drop_unknown=True)
+
+
+def compiled():
+    for template, config in CONFIGS:
+        compile_template(template)(config, drop_unknown=True)
+
+
+def batch():
+    for template, configs in BATCHES.values():
+        for _ in validate_batch(template, configs):
+            pass
+
+
+def main(repeat):
+    print('{} configs, best of 5 x {} runs'.format(len(CONFIGS), repeat))
+    times = {}
+    for func in (generic, compiled, batch):
+        best = min(timeit.repeat(func, number=repeat, repeat=5))
+        times[func.__name__] = best
+        print('{:<10}{:>10.1f} us per config'.format(
+            func.__name__, best / repeat / len(CONFIGS) * 1e6))
+    print('speedup   {:>10.1f}x'.format(times['generic'] / times['compiled']))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
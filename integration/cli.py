@@ -11,6 +11,21 @@ except ImportError:
 # from tools import pplist
 
 
+def ping(host, port, username, password, samples):
+    from pynio.rest import REST
+    latency = REST(host, port, (username, password)).ping(samples)
+    print("Ping {}:{} ({} samples)".format(host, port, samples))
+    if not latency.available:
+        print("    server unavailable, {} failures".format(latency.failures))
+        return 1
+    ms = lambda t: '{:8.1f} ms'.format(t * 1000)
+    for name in ('cold', 'warm', 'p50', 'p90', 'p99', 'mean'):
+        print("    {:<6}{}".format(name, ms(getattr(latency, name))))
+    print("    failures: {}, suggested timeout: {:.1f} s, workers: {}".format(
+        latency.failures, latency.timeout, latency.workers))
+    return 0
+
+
 def main(host, port, username, password):
     nio = Instance(host, port, (username, password))
     print("#" * 50)
@@ -33,6 +48,7 @@ def main(host, port, username, password):
 
 if __name__ == '__main__':
     import argparse
+    import sys
     parser = argparse.ArgumentParser(
         description='Open an interactive session to a nio Instance')
     parser.add_argument('-i', '--host', default='127.0.0.1')
@@ -40,6 +56,10 @@ if __name__ == '__main__':
     parser.add_argument('-l', '--login', type=str, nargs=2,
                         metavar=("USERNAME", "PASSWORD"),
                         default=('Admin', 'Admin'))
+    parser.add_argument('--ping', type=int, metavar='SAMPLES',
+                        help='only measure the latency to the instance')
     args = parser.parse_args()
     print("Using settings:", args)
+    if args.ping is not None:
+        sys.exit(ping(args.host, args.port, *args.login, samples=args.ping))
     main(args.host, args.port, *args.login)
@@ -1,7 +1,9 @@
 from copy import deepcopy
+import json
 import pprint
+import threading
 
-from .properties import load_block
+from .properties import diff, dumps, compile_template, templates
 
 
 class Block(object):
@@ -23,6 +25,8 @@ class Block(object):
         status (str): Status of service.
 
     """
+    __slots__ = ('_name', '_type', '_template', '_config', '_instance',
+                 '_generation', '_validated', '_saved')
 
     def __init__(self, name, type, config=None, instance=None):
         if not name:
@@ -32,6 +36,9 @@ class Block(object):
         self._template = None
         self._config = deepcopy(config) or {}
         self._instance = instance
+        self._generation = 0  # incremented every time config is replaced
+        self._validated = None  # (template, generation) of typed config
+        self._saved = None  # (instance, json) of the last save
         self._config['name'] = name
         if 'type' in self._config:
             if type != config['type']:
@@ -45,6 +52,11 @@ class Block(object):
         Will create a new block if one does not exist by this name.
         Otherwise it will update the existing block config.
 
+        The config is only validated against the template again if it was
+        replaced or the template changed since it was last validated. If
+        the block was already saved to this instance, only the fields that
+        changed since then are sent, and nothing if none did.
+
         Raises:
             Exception: If service is not associated with an instance.
 
@@ -53,20 +65,57 @@ class Block(object):
         if not self._instance:
             raise Exception('Block is not associated with an instance')
 
-        # setup config
+        template = self._instance.blocks_types[self._type].template
         config = self.config
         config['name'] = self._name
         config['type'] = self._type
-        # load template and then reload config
-        self.template = self._instance.blocks_types[self._type].template
-        self.config = config
-        # put onto the web
-        self._put('blocks/{}'.format(self._name), self.json())
+        if not self._is_validated(template):
+            # load template and then reload config
+            self.template = template
+            self.config = config
+        # encoded straight from the typed config, the basic types to
+        # compare with the next save are read back from the json
+        body = dumps(self._config)
+        data = json.loads(body)
+        endpoint = 'blocks/{}'.format(self._name)
+        saved = self._saved
+        if saved is None or saved[0] is not self._instance:
+            # put onto the web
+            self._put(endpoint, body)
+        else:
+            patch = diff(saved[1], data)
+            if patch is None:
+                self._put(endpoint, body)
+            elif patch:
+                self._patch(endpoint, patch, body)
+        self._saved = (self._instance, data)
         self._instance.blocks[self._name] = self
 
+    def _is_validated(self, template):
+        '''Whether the current config was typed by `template`.
+
+        Changes made to a typed config are checked as they are made, so it
+        only needs to be validated again when it is replaced.
+        '''
+        validated = self._validated
+        return (validated is not None and validated[0] is template and
+                validated[1] == self._generation)
+
     def _put(self, endpoint, config):
         self._instance._put(endpoint, config)
 
+    def _patch(self, endpoint, patch, config):
+        self._instance._patch(endpoint, patch, config)
+
+    def __deepcopy__(self, memo=None):
+        # the config is copied, templates are read only and the instance
+        # is only referenced, so those are shared
+        new = Block.__new__(type(self))
+        for attr in Block.__slots__:
+            object.__setattr__(new, attr, getattr(self, attr))
+        new._config = deepcopy(self._config, memo)
+        return new
+
     @property
     def name(self):
         return self._name
@@ -90,14 +139,14 @@ class Block(object):
 
     @config.setter
     def config(self, value):
+        self._generation += 1
         if self._template is None:
             self._config = value
             return
-        config = deepcopy(self._template)
-        config.readonly = False
-        config.update(value, drop_unknown=True,
-                      drop_logger=self._instance.droplog)
+        config = compile_template(self._template)(
+            value, drop_unknown=True, drop_logger=self._instance.droplog)
         self._config = config
+        self._validated = (self._template, self._generation)
 
     def json(self):
         if hasattr(self._config, '__basic__'):
@@ -118,11 +167,7 @@ class Block(object):
         if self._instance is None:
             raise TypeError("Block is not tied to an instance")
 
-        template = load_block(value)
-        template.type = type
-        template.name = ''
-        template.readonly = True
-        self._template = template
+        self._template = templates.load(value, type, name='')
         self.config = self._config  # reload own config with new template
 
     def delete(self):
@@ -132,6 +177,7 @@ class Block(object):
             s.remove_block(self)
         self._instance.blocks.pop(self._name)
         self._instance = None  # make sure it isn't used anymore
+        self._saved = None  # saved again in full if it is added back
 
     def in_use(self):
         """Return a list of services that use this block.
@@ -142,13 +188,67 @@ class Block(object):
         """
         if not self._instance:
             raise TypeError("Block must be tied to instance")
-        name = self.name
-        return [service for service in
-                self._instance.services.values()
-                if next((True for b in service.blocks if b.name == name), False)
-                ]
+        return [service for service in self._instance.services.values()
+                if self in service]
 
     def __str__(self):
         config = '\n  '.join(pprint.pformat(self.config).split('\n'))
         return ("Block({}, {}).config:{{\n  ".format(self.name, self.type) +
                                         config + '\n}\n')
+
+
+class BlockMap(dict):
+    """Dictionary of blocks by name that counts its changes.
+
+    `version` is incremented every time a block is added, replaced or
+    removed, so objects can cache lookups into the map and tell when they
+    are outdated. Changes are made under a lock, so blocks saved from
+    several threads at once never share a version.
+
+    """
+    __slots__ = ('version', '_lock')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            if dict.get(self, key) is not value:
+                self.version += 1
+            dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        with self._lock:
+            dict.__delitem__(self, key)
+            self.version += 1
+
+    def pop(self, *args):
+        with self._lock:
+            self.version += 1
+            return dict.pop(self, *args)
+
+    def popitem(self):
+        with self._lock:
+            self.version += 1
+            return dict.popitem(self)
+
+    def setdefault(self, key, default=None):
+        with self._lock:
+            self.version += 1
+            return dict.setdefault(self, key, default)
+
+    def update(self, *args, **kwargs):
+        with self._lock:
+            self.version += 1
+            dict.update(self, *args, **kwargs)
+
+    def clear(self):
+        with self._lock:
+            self.version += 1
+            dict.clear(self)
+
+    def __reduce__(self):
+        # the lock can't be copied or pickled
+        return (type(self), (dict(self),))
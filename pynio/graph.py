@@ -0,0 +1,169 @@
+from .parallel import waves
+
+
+class ExecutionGraph(object):
+    '''Directed graph of the blocks in a service.
+
+    Mirrors the `execution` list of a service config, where every entry is
+    a block name with the names of the blocks it sends signals to. Nodes
+    and receivers keep the order of that list, and both directions of every
+    edge are indexed so lookups, insertions and removals are O(1).
+
+    Receivers do not have to be nodes themselves, just like in `execution`.
+    '''
+    __slots__ = ('_receivers', '_senders')
+
+    def __init__(self, execution=()):
+        self._receivers = {}  # name: {receiver: None}, dicts keep order
+        self._senders = {}  # name: set of names sending to it
+        for connection in execution:
+            name = connection['name']
+            self.add_node(name)
+            for receiver in connection.get('receivers', ()):
+                self.add_edge(name, receiver)
+
+    def __contains__(self, name):
+        return name in self._receivers
+
+    def __iter__(self):
+        return iter(self._receivers)
+
+    def __len__(self):
+        return len(self._receivers)
+
+    def add_node(self, name):
+        '''Add a block with no receivers. Does nothing if it exists'''
+        if name not in self._receivers:
+            self._receivers[name] = {}
+
+    def add_edge(self, sender, receiver):
+        '''Make `sender` send signals to `receiver`'''
+        self.add_node(sender)
+        self._receivers[sender][receiver] = None
+        self._senders.setdefault(receiver, set()).add(sender)
+
+    def remove_edge(self, sender, receiver):
+        self._receivers[sender].pop(receiver, None)
+        self._senders.get(receiver, set()).discard(sender)
+
+    def remove_node(self, name):
+        '''Remove a block and every connection to and from it'''
+        for sender in self._senders.pop(name, ()):
+            self._receivers[sender].pop(name, None)
+        for receiver in self._receivers.pop(name, ()):
+            self._senders[receiver].discard(name)
+
+    def receivers(self, name):
+        return list(self._receivers[name])
+
+    def senders(self, name):
+        return set(self._senders.get(name, ()))
+
+    def edges(self):
+        return [(sender, receiver) for (sender, receivers)
+                in self._receivers.items() for receiver in receivers]
+
+    def execution(self):
+        '''The graph as the `execution` list of a service config'''
+        return [{'name': name, 'receivers': list(receivers)}
+                for (name, receivers) in self._receivers.items()]
+
+    def fan_out(self):
+        '''Number of receivers of every block'''
+        return {name: len(receivers)
+                for (name, receivers) in self._receivers.items()}
+
+    def fan_in(self):
+        '''Number of senders of every block'''
+        return {name: len(self._senders.get(name, ()))
+                for name in self._receivers}
+
+    def levels(self):
+        '''Group blocks so every block only receives from earlier groups.
+
+        Raises:
+            ValueError: If the graph has a cycle.
+        '''
+        return waves(self._receivers, self._senders)
+
+    def topological_order(self):
+        '''Blocks ordered so senders come before their receivers.
+
+        Raises:
+            ValueError: If the graph has a cycle.
+        '''
+        return [name for level in self.levels() for name in level]
+
+    def cycles(self):
+        '''Return every cycle as a list of the block names in it.
+
+        These are the strongly connected components with more than one
+        block, plus blocks that send to themselves.
+        '''
+        index = {}
+        lowlink = {}
+        stack, onstack = [], set()
+        out = []
+        counter = 0
+        for root in self._receivers:
+            if root in index:
+                continue
+            index[root] = lowlink[root] = counter
+            counter += 1
+            stack.append(root)
+            onstack.add(root)
+            work = [(root, iter(self._receivers[root]))]
+            while work:
+                name, receivers = work[-1]
+                for receiver in receivers:
+                    if receiver not in self._receivers:
+                        continue
+                    if receiver not in index:
+                        index[receiver] = lowlink[receiver] = counter
+                        counter += 1
+                        stack.append(receiver)
+                        onstack.add(receiver)
+                        work.append((receiver,
+                                     iter(self._receivers[receiver])))
+                        break
+                    elif receiver in onstack:
+                        lowlink[name] = min(lowlink[name], index[receiver])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        lowlink[parent] = min(lowlink[parent], lowlink[name])
+                    if lowlink[name] == index[name]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            onstack.discard(member)
+                            component.append(member)
+                            if member == name:
+                                break
+                        if (len(component) > 1 or
+                                name in self._receivers[name]):
+                            out.append(component[::-1])
+        return out
+
+    def critical_path(self):
+        '''Longest chain of blocks, as a list of names.
+
+        Raises:
+            ValueError: If the graph has a cycle.
+        '''
+        longest = {}  # name: (length, previous)
+        for name in self.topological_order():
+            best = (1, None)
+            for sender in self._senders.get(name, ()):
+                if sender in longest and longest[sender][0] + 1 > best[0]:
+                    best = (longest[sender][0] + 1, sender)
+            longest[name] = best
+        if not longest:
+            return []
+        name = max(longest, key=lambda n: longest[n][0])
+        path = []
+        while name is not None:
+            path.append(name)
+            name = longest[name][1]
+        return path[::-1]
@@ -1,7 +1,16 @@
+import logging
 from copy import deepcopy
+
+import requests
+
 from pynio.rest import REST
-from pynio.block import Block
+from pynio.properties import check, compile_template, templates
+from pynio.block import Block, BlockMap
 from pynio.service import Service
+from pynio.watch import ServiceWatcher
+from pynio import parallel
+
+log = logging.getLogger(__name__)
 
 
 class Instance(REST):
@@ -23,26 +32,61 @@ class Instance(REST):
             instance.
         services (dict of Service): A collection of service names with their
             Service instance.
+        services_types (dict of Properties): Service templates by service
+            type, loaded once on first use and shared by all services.
 
     """
+    _services_types = None
 
     def __init__(self, host='127.0.0.1', port=8181, creds=None):
         super().__init__(host, port, creds)
         self.droplog = print
         self.blocks_types = {}
-        self.blocks = {}
+        self.blocks = BlockMap()
         self.services = {}
         # reset to initalize instance
         self.reset()
 
     def reset(self):
+        # objects that are dropped may no longer exist in nio, saving one
+        # again PUTs all of it
+        for obj in list(self.blocks.values()) + list(self.services.values()):
+            obj._saved = None
         self.blocks_types, self.blocks = self._get_blocks()
         self.services = self._get_services()
+        self._services_types = None  # reloaded when next needed
+
+    @property
+    def services_types(self):
+        if self._services_types is None:
+            self._services_types = self._get_services_types()
+        return self._services_types
 
     def nio(self):
         """ Returns nio version info."""
         return self._get('nio')
 
+    def watch(self, services=None, callback=None, **kwargs):
+        """Watch service statuses in the background.
+
+        Statuses are polled with adaptive intervals, see `ServiceWatcher`
+        for the keyword arguments.
+
+        Args:
+            services (list of Service or str, optional): Services to watch.
+                Default is all services of the instance.
+            callback (callable, optional): Called with a `StatusChange`
+                every time a service changes status.
+
+        Returns:
+            ServiceWatcher: The started watcher. Iterate over it to consume
+                transitions and call `stop` when done.
+
+        """
+        callbacks = [callback] if callback is not None else None
+        watcher = ServiceWatcher(self, services, callbacks, **kwargs)
+        return watcher.start()
+
     def add_block(self, block, overwrite=False):
         """Add block to instance.
 
@@ -60,9 +104,72 @@ class Instance(REST):
             raise ValueError
         block = deepcopy(block)
         block._instance = self
+        block._saved = None  # the copy is sent in full
         block.save()
         return block
 
+    def clone_blocks(self, prototype, rows, overwrite=False,
+                     max_workers=None):
+        """Create many blocks from a prototype block.
+
+        Every row is expanded into the prototype's config plus the row's
+        overrides. All rows are validated against the shared template of
+        the prototype's type before anything is written, and the blocks
+        are then saved in parallel.
+
+        Args:
+            prototype (Block): Block whose type and config are cloned.
+            rows (iterable of str or dict): The name of each new block, or a
+                dict with the 'name' of the block and the properties to
+                override. Nested properties can be partially overridden.
+            overwrite (bool, optional): If True, existing blocks with the
+                same names are updated. Default is False.
+            max_workers (int, optional): Maximum number of blocks saved at
+                the same time.
+
+        Returns:
+            Results: Maps block names to the new Block or to the exception
+                raised while saving it.
+
+        Raises:
+            ValueError: If any row is invalid, listing all invalid rows.
+                Nothing is written in that case.
+
+        """
+        template = self.blocks_types[prototype.type].template
+        converter = compile_template(template)
+        base = converter(prototype.json(), drop_unknown=True,
+                         drop_logger=self.droplog).__basic__()
+        blocks, errors = [], []
+        for row in rows:
+            if isinstance(row, str):
+                name, overrides = row, {}
+            else:
+                overrides = dict(row)
+                name = overrides.pop('name', None)
+            try:
+                if not overwrite and name in self.blocks:
+                    raise ValueError("block already exists")
+                block = Block(name, prototype.type, instance=self)
+                config = converter(base)
+                converter.apply(config, overrides, drop_unknown=True,
+                                drop_logger=self.droplog)
+                config['name'] = name
+            except Exception as e:
+                errors.append("{}: {}".format(name, e))
+                continue
+            block._template = template
+            block._config = config
+            block._validated = (template, block._generation)
+            blocks.append(block)
+        if errors:
+            raise ValueError("Invalid blocks:\n  " + "\n  ".join(errors))
+
+        def save(block):
+            block.save()
+            return block
+        return parallel.run(save, blocks, self._workers(max_workers))
+
     def add_service(self, service, overwrite=False, blocks=False):
         """Add service to instance.
 
@@ -91,6 +198,7 @@ class Instance(REST):
             [self.add_block(b, True) for b in service.blocks]
         service = deepcopy(service)
         service._instance = self
+        service._saved = None  # the copy is sent in full
         service.save()
         return service
 
@@ -101,19 +209,29 @@ class Instance(REST):
             b._load_template(btype, template)
             blocks_types[btype] = b
 
-        blocks = {}
+        blocks = BlockMap()
         for bname, config in self._get('blocks').items():
             btype = config['type']
-            b = deepcopy(blocks_types[btype])
-            b._name = bname
-            b._instance = self
-            b._config.update(config, drop_unknown=True,
-                             drop_logger=self.droplog)
+            b = Block(bname, btype, instance=self)
+            # share the type's template so saving does not re-apply it
+            b.template = blocks_types[btype].template
+            b.config = config
             b._config['name'] = bname
+            b._saved = (self, b.json())
             blocks[bname] = b
 
         return blocks_types, blocks
 
+    def _get_services_types(self):
+        try:
+            resp = self._get('services_types')
+        except (requests.exceptions.RequestException, ValueError) as e:
+            # validation is skipped for services without a template
+            log.warning("Could not load service templates: {}".format(e))
+            return {}
+        return {stype: load_service_type(stype, template)
+                for (stype, template) in resp.items()}
+
     def _get_services(self):
         services = {}
         resp = self._get('services')
@@ -121,6 +239,8 @@ class Instance(REST):
             services[s] = Service(resp[s].get('name', s),
                                   config=resp[s],
                                   instance=self)
+            # the service copied the response, so it can be kept as it is
+            services[s]._saved = (self, resp[s])
         return services
 
     def create_block(self, name, type, config=None):
@@ -159,6 +279,160 @@ class Instance(REST):
         for s in self.services.items():
             s.save()
 
+    def start_all(self, services=None, max_workers=None, depends=None,
+                  timeout=None):
+        """Start services in parallel.
+
+        Args:
+            services (list of Service or str, optional): Services to start.
+                Default is all services of the instance.
+            max_workers (int, optional): Maximum number of services started
+                at the same time. Default is suggested by the last `ping`,
+                or 8.
+            depends (dict, optional): Maps a service name to the names of
+                services that have to be started before it. Services whose
+                dependencies failed to start are skipped.
+            timeout (float, optional): Request timeout per service. Default
+                is suggested by the last `ping`, or no timeout.
+
+        Returns:
+            Results: Maps service names to the command response or to the
+                exception raised while starting the service.
+
+        """
+        timeout = self._timeout(timeout)
+        return parallel.run(lambda s: s.start(timeout=timeout),
+                            self._select_services(services),
+                            self._workers(max_workers), depends)
+
+    def stop_all(self, services=None, max_workers=None, depends=None,
+                 timeout=None):
+        """Stop services in parallel.
+
+        Takes the same arguments as `start_all`. `depends` has the same
+        meaning as for `start_all`, so services are stopped before the
+        services they depend on.
+
+        """
+        timeout = self._timeout(timeout)
+        return parallel.run(lambda s: s.stop(timeout=timeout),
+                            self._select_services(services),
+                            self._workers(max_workers), _reverse(depends))
+
+    def restart_all(self, services=None, max_workers=None, depends=None,
+                    timeout=None):
+        """Stop and then start services, restarting many in parallel.
+
+        Takes the same arguments as `start_all`. All services are stopped
+        first, in the order of `stop_all`, so services are stopped before
+        the services they depend on. The ones that stopped are then started
+        in the order of `start_all`.
+
+        Returns:
+            Results: Maps service names to the start response, or to the
+                exception raised while stopping or starting the service.
+
+        """
+        selected = self._select_services(services)
+        workers = self._workers(max_workers)
+        timeout = self._timeout(timeout)
+        stopped = parallel.run(lambda s: s.stop(timeout=timeout), selected,
+                               workers, _reverse(depends))
+        failed = stopped.failed
+        results = parallel.run(lambda s: s.start(timeout=timeout),
+                               [s for s in selected if s.name not in failed],
+                               workers, depends)
+        results.update(failed)
+        results.elapsed += stopped.elapsed
+        return results
+
+    def wait_all(self, services=None, state='started', timeout=None,
+                 max_workers=None, **kwargs):
+        """Wait for services to reach a status in parallel.
+
+        See `Service.wait_until` for the polling keyword arguments.
+
+        Args:
+            services (list of Service or str, optional): Services to wait
+                for. Default is all services of the instance.
+            state (str or list of str, optional): Status to wait for.
+                Default is 'started'.
+            timeout (float, optional): Maximum number of seconds to wait
+                for each service.
+
+        Returns:
+            Results: Maps service names to the status reached or to the
+                exception (e.g. `TimeoutError`) raised while waiting.
+
+        """
+        return parallel.run(
+            lambda s: s.wait_until(state, timeout, **kwargs),
+            self._select_services(services), self._workers(max_workers))
+
+    def _workers(self, max_workers):
+        if max_workers is not None:
+            return max_workers
+        if self.latency is not None and self.latency.workers is not None:
+            return self.latency.workers
+        return 8
+
+    def _timeout(self, timeout):
+        if timeout is not None or self.latency is None:
+            return timeout
+        return self.latency.timeout
+
+    def _select_services(self, services):
+        if services is None:
+            return list(self.services.values())
+        return [self.services[s] if isinstance(s, str) else s
+                for s in services]
+
+    def validate(self, blocks=(), services=()):
+        """Check blocks and services locally before deploying them.
+
+        Blocks are checked against the templates in `blocks_types`, and
+        services against the service templates. Every block used by a
+        service, as a sender or a receiver, has to be in `blocks` or already
+        in the instance. Nothing is sent to nio (the service templates are
+        requested once if they were not loaded yet).
+
+        Args:
+            blocks (list of Block, optional): Blocks to deploy.
+            services (list of Service, optional): Services to deploy.
+
+        Returns:
+            list of str: Every problem found, empty if there are none.
+
+        """
+        problems = []
+        names = set(self.blocks)
+        for block in blocks:
+            names.add(block.name)
+            if block.type not in self.blocks_types:
+                problems.append("Block {}: unknown type {}".format(
+                    block.name, block.type))
+                continue
+            template = self.blocks_types[block.type].template
+            problems.extend(
+                "Block {}: invalid {}: {}".format(block.name, key, error)
+                for (key, error) in check(template, block.json()))
+        for service in services:
+            # receivers don't have to be listed themselves, check them too
+            graph = service._execution()
+            used = dict.fromkeys(graph)
+            used.update(dict.fromkeys(r for (_, r) in graph.edges()))
+            missing = [name for name in used if name not in names]
+            if missing:
+                problems.append("Service {}: unknown blocks {}".format(
+                    service.name, missing))
+            template = self.services_types.get(service.type)
+            if template is not None:
+                problems.extend(
+                    "Service {}: invalid {}: {}".format(service.name, key,
+                                                        error)
+                    for (key, error) in check(template, service.config))
+        return problems
+
     def DELETE_ALL(self):
         """Deletes all blocks and services from an instance."""
         blocks, services = self._get('blocks'), self._get('services')
@@ -168,3 +442,19 @@ class Instance(REST):
             self._get('services/{}/stop'.format(s))
             self._delete('services/{}'.format(s))
         self.reset()
+
+
+def load_service_type(type, template):
+    """Load a service template from nio into a shared, read only template."""
+    return templates.load(template, type)
+
+
+def _reverse(depends):
+    '''Reverse a dependency mapping'''
+    if not depends:
+        return depends
+    out = {}
+    for name, deps in depends.items():
+        for dep in deps:
+            out.setdefault(dep, []).append(name)
+    return out
@@ -0,0 +1,163 @@
+import threading
+import time
+from copy import deepcopy
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class Results(dict):
+    '''Outcome of a bulk operation.
+
+    Maps every name to the value returned for it, or to the exception
+    that was raised for it.
+
+    Attributes:
+        elapsed (float): Seconds the whole operation took.
+    '''
+    elapsed = 0.0
+
+    @property
+    def succeeded(self):
+        return [name for (name, value) in self.items()
+                if not isinstance(value, Exception)]
+
+    @property
+    def failed(self):
+        return {name: value for (name, value) in self.items()
+                if isinstance(value, Exception)}
+
+    @property
+    def ok(self):
+        return not self.failed
+
+    def __repr__(self):
+        return 'Results(succeeded={}, failed={}, elapsed={:.3f})'.format(
+            len(self.succeeded), sorted(self.failed), self.elapsed)
+
+
+class Coalescer(object):
+    '''Shares one call between threads that make it at the same time.
+
+    While a call for a key is in flight, other callers with the same key
+    wait for it and get its result (or exception) instead of making their
+    own request. Every waiter gets its own copy of the result, so callers
+    can modify what they get back.
+    '''
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def call(self, key, function, *args, **kwargs):
+        with self._lock:
+            future = self._calls.get(key)
+            owner = future is None
+            if owner:
+                future = self._calls[key] = Future()
+        if not owner:
+            return deepcopy(future.result())
+        try:
+            result = function(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+def waves(names, depends=None):
+    '''Group `names` into waves that respect `depends`.
+
+    Args:
+        names (list of str): Names to order.
+        depends (dict, optional): Maps a name to the names that have to be
+            handled before it. Names that are not in `names` are ignored.
+
+    Returns:
+        list of list of str: Every name appears in exactly one wave and
+            only depends on names of earlier waves.
+
+    Raises:
+        ValueError: If the dependencies contain a cycle.
+    '''
+    names = list(names)
+    if not depends:
+        return [names] if names else []
+    members = set(names)
+    waiting = {n: {d for d in depends.get(n, ()) if d in members and d != n}
+               for n in names}
+    dependents = {n: [] for n in names}
+    for name, deps in waiting.items():
+        for dep in deps:
+            dependents[dep].append(name)
+    out = []
+    wave = [n for n in names if not waiting[n]]
+    while wave:
+        out.append(wave)
+        nxt = []
+        for name in wave:
+            for dependent in dependents[name]:
+                deps = waiting[dependent]
+                deps.discard(name)
+                if not deps:
+                    nxt.append(dependent)
+        wave = nxt
+    if sum(len(w) for w in out) != len(names):
+        cycle = sorted(n for n in names if waiting[n])
+        raise ValueError("Dependency cycle between {}".format(cycle))
+    return out
+
+
+def run(function, items, max_workers=8, depends=None, key=None):
+    '''Call `function` on every item using at most `max_workers` threads.
+
+    Args:
+        function (callable): Called with one item at a time.
+        items (list): Items to process.
+        max_workers (int, optional): Maximum number of concurrent calls.
+        depends (dict, optional): Ordering constraints between item keys,
+            see `waves`. Items whose dependencies failed are not processed
+            and fail with a `RuntimeError`.
+        key (callable, optional): Returns the name of an item. Default
+            uses the item's `name` attribute.
+
+    Returns:
+        Results: Return value or exception for every item.
+
+    Raises:
+        ValueError: If two items have the same name.
+    '''
+    key = key or (lambda i: i.name)
+    start = time.monotonic()
+    named = {}
+    for item in items:
+        name = key(item)
+        if name in named:
+            raise ValueError("Duplicate name {!r}".format(name))
+        named[name] = item
+    items = named
+    results = Results()
+
+    def call(name):
+        try:
+            return function(items[name])
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max(1, max_workers)) as executor:
+        for wave in waves(items, depends):
+            todo = []
+            for name in wave:
+                failed = [d for d in (depends or {}).get(name, ())
+                          if isinstance(results.get(d), Exception)]
+                if failed:
+                    results[name] = RuntimeError(
+                        "{} skipped, dependencies failed: {}".format(
+                            name, failed))
+                else:
+                    todo.append(name)
+            results.update(zip(todo, executor.map(call, todo)))
+    results.elapsed = time.monotonic() - start
+    return results
@@ -1,3 +1,11 @@
+import hashlib
+import json
+import sys
+import threading
+from array import array
+from collections import OrderedDict, namedtuple
+from itertools import islice
+from json.encoder import encode_basestring_ascii
 from enum import Enum
 from copy import deepcopy
 
@@ -9,7 +17,67 @@ def isiter(obj):
             else False)
 
 
-class AttrDict(dict):
+_class_attrs = {}  # class: names of its attributes
+_descriptors = {}  # type: (__get__, __set__), either can be None
+
+
+class _AnyName(object):
+    '''Stands in for the attribute names of classes with a __dict__'''
+    __slots__ = ()
+
+    def __contains__(self, name):
+        return True
+
+
+class _Watched(type):
+    '''Metaclass that drops the cached attributes when a class changes'''
+    def __setattr__(cls, name, value):
+        type.__setattr__(cls, name, value)
+        _forget_classes()
+
+    def __delattr__(cls, name):
+        type.__delattr__(cls, name)
+        _forget_classes()
+
+
+def _forget_classes():
+    # subclasses see the change too, and changes are rare
+    _class_attrs.clear()
+    _descriptors.clear()
+
+
+def _attrs(cls):
+    '''Names of the attributes defined by `cls` and its bases.
+
+    Properties types use `__slots__`, so every real attribute of an instance
+    is defined on its class and lookups can be answered from this set
+    instead of trying the attribute and catching AttributeError.
+    Subclasses whose instances have a `__dict__` can have any attribute.
+    '''
+    names = _class_attrs.get(cls)
+    if names is None:
+        slotted = not any('__dict__' in vars(c) for c in cls.__mro__)
+        names = frozenset(dir(cls)) if slotted else _AnyName()
+        _class_attrs[cls] = names
+    return names
+
+
+def _descriptor(cls):
+    '''`__get__` and `__set__` of values of type `cls`.
+
+    Only cached for classes whose changes are seen: builtins can't change
+    and properties types are `_Watched`.
+    '''
+    try:
+        return _descriptors[cls]
+    except KeyError:
+        out = (getattr(cls, '__get__', None), getattr(cls, '__set__', None))
+        if type(cls) is _Watched or cls.__module__ == 'builtins':
+            _descriptors[cls] = out
+        return out
+
+
+class AttrDict(dict, metaclass=_Watched):
     '''Dictionary that allows item access via getattr
     It also does some fun stuff with descriptors to allow objects in
     it's dictionary to use descriptors (you can define the
@@ -21,17 +89,70 @@ class AttrDict(dict):
             attrdict.key = value := attrdict['key'] = value
     -   This upholds descriptors for lesser objects, to make for default
             item assignment and typing
+    -   Keys listed in `_shared` hold values shared with other trees (the
+        placeholders of lazily loaded templates, and the read only values
+        of the tree a deepcopy was made from). They are replaced with an
+        own copy the first time they are looked up, so deepcopying a read
+        only tree only copies its top level.
+    -   `readonly` freezes the whole tree, nested objects and lists
+        included. Frozen trees hand out their shared values as they are,
+        since nothing can change them. Values shared with other trees are
+        pinned, they stay read only for good (see `_pin`).
     '''
-    readonly = False  # doesn't allow item setting at all
+    __slots__ = ('_readonly', '_shared')
 
     def __init__(self, *args, **kwargs):
-        dict.__init__(self, *args, **kwargs)
+        object.__setattr__(self, '_readonly', False)
+        object.__setattr__(self, '_shared', None)
+        if args and isinstance(args[0], AttrDict):
+            # the raw values, the shared ones stay shared (see below)
+            dict.__init__(self, dict.items(args[0]), **kwargs)
+        else:
+            dict.__init__(self, *args, **kwargs)
+        if args and isinstance(args[0], AttrDict):
+            shared = object.__getattribute__(args[0], '_shared')
+            if shared:
+                object.__setattr__(self, '_shared', set(shared))
         # Make all internal dictionaries be own type. Make sure this
         # Overrides any super class's settings
-        for key, value in self.items():
+        for key, value in dict.items(self):
             if type(value) == dict:
                 dict.__setitem__(self, key, self.__class__(value))
 
+    @property
+    def readonly(self):
+        '''doesn't allow item setting at all, nested values included'''
+        return bool(self._readonly)
+
+    @readonly.setter
+    def readonly(self, value):
+        readonly = object.__getattribute__(self, '_readonly')
+        if readonly == _PINNED:
+            if not value:
+                raise TypeError('{} is shared and stays read only, change '
+                                'a deepcopy of it'.format(type(self).__name__))
+            return
+        shared = object.__getattribute__(self, '_shared')
+        if value:
+            # frozen trees hold no placeholders, so reading never writes
+            for key in shared or ():
+                nested = dict.__getitem__(self, key)
+                if isinstance(nested, _LazyTemplate):
+                    dict.__setitem__(self, key, nested.load())
+        object.__setattr__(self, '_readonly', bool(value))
+        for key, nested in dict.items(self):
+            if not isinstance(nested, _FREEZABLE):
+                continue
+            if value or object.__getattribute__(nested, '_readonly') != \
+                    _PINNED:
+                nested.readonly = value
+            else:
+                # shared with other trees, copied before writing
+                if shared is None:
+                    shared = set()
+                    object.__setattr__(self, '_shared', shared)
+                shared.add(key)
+
     def update(self, value, drop_unknown=False, drop_logger=None):
         '''Update self from a value dictionary.
 
@@ -98,6 +219,27 @@ class AttrDict(dict):
         if self.readonly:
             raise TypeError('{} is read only'.format(self))
         dict.__setitem__(self, key, value)
+        shared = object.__getattribute__(self, '_shared')
+        if shared:
+            shared.discard(key)
+
+    def _own(self, key):
+        '''Return the value of `key`, copying it first if it is shared'''
+        obj = dict.__getitem__(self, key)
+        shared = object.__getattribute__(self, '_shared')
+        if shared and key in shared:
+            if object.__getattribute__(self, '_readonly'):
+                # nothing is written to a read only tree, and freezing
+                # loaded its placeholders (see readonly)
+                return obj
+            shared.discard(key)
+            obj = obj.__deepcopy__()
+            dict.__setitem__(self, key, obj)
+        return obj
+
+    def _own_all(self):
+        for key in list(object.__getattribute__(self, '_shared') or ()):
+            self._own(key)
 
     def __getattribute__(self, attr, keyonly=False):
         '''Where all the magic happens.
@@ -105,18 +247,23 @@ class AttrDict(dict):
         Allows for item assignment through attribute notation and makes sure
         that object's descriptors are used
         '''
-        try:
-            if keyonly: raise AttributeError
+        if not keyonly and attr in (_class_attrs.get(type(self)) or
+                                    _attrs(type(self))):
             # First try the standard attr lookup and return that
-            return object.__getattribute__(self, attr)
-        except AttributeError:
-            # all attributes that the user sets are stored in the dictionary
-            # internal keys
             try:
-                obj = dict.__getitem__(self, attr)
-            except KeyError:
-                raise AttributeError
-        return self._get(obj)
+                return object.__getattribute__(self, attr)
+            except AttributeError:
+                pass  # unset slot or instance attribute
+        # all attributes that the user sets are stored in the dictionary
+        # internal keys
+        if not dict.__contains__(self, attr):
+            raise AttributeError(attr)
+        if object.__getattribute__(self, '_shared'):
+            obj = self._own(attr)
+        else:
+            obj = dict.__getitem__(self, attr)
+        get = _descriptor(type(obj))[0]
+        return obj if get is None else get(obj, self)
 
     def __setattr__(self, attr, value, keyonly=False):
         '''Overrides standard setattr to allow dictionary item assignment
@@ -126,44 +273,137 @@ class AttrDict(dict):
         Dev:
             - keyonly only looks inside the dictionary keys (not attributes)
         '''
-        try:
-            if keyonly:
-                raise AttributeError  # jump to lookup by key
-            # make sure the attribute exists before we set it
-            obj = object.__getattribute__(self, attr)
+        if not keyonly and self._is_attr(attr):
             # actual attr setting does NOT use special features
             #   (i.e. descriptors)
             object.__setattr__(self, attr, value)
             return
-        except AttributeError:
-            if attr in self:
-                obj = dict.__getitem__(self, attr)
-            else:  # New object, only minor checking
-                return self._set(attr, value)
-
-        if hasattr(obj, '__set__'):
+        if not dict.__contains__(self, attr):
+            # New object, only minor checking
+            return self._set(attr, value)
+        if object.__getattribute__(self, '_readonly'):
+            raise TypeError('{} is read only'.format(self))
+        obj = dict.__getitem__(self, attr)
+        set_ = _descriptor(type(obj))[1]
+        if set_ is not None:
             # If it is a descriptor object, let it handle everything else
-            obj.__set__(self, value)
+            set_(obj, self, value)
         else:
             self._set(attr, value)
 
+    def _is_attr(self, attr):
+        '''Whether `attr` is a real attribute rather than a key'''
+        if attr not in _attrs(type(self)):
+            return False
+        try:
+            object.__getattribute__(self, attr)
+        except AttributeError:
+            return False
+        return True
+
     def __setitem__(self, key, value):
         self.__setattr__(key, value, keyonly=True)
 
     def __getitem__(self, key):
-        try:
-            return self.__getattribute__(key, keyonly=True)
-        except AttributeError as exc:
-            raise KeyError from exc
+        if object.__getattribute__(self, '_shared'):
+            obj = self._own(key)
+        else:
+            obj = dict.__getitem__(self, key)
+        get = _descriptor(type(obj))[0]
+        return obj if get is None else get(obj, self)
+
+    def _check_writable(self):
+        if object.__getattribute__(self, '_readonly'):
+            raise TypeError('{} is read only'.format(self))
+
+    def __delitem__(self, key):
+        self._check_writable()
+        dict.__delitem__(self, key)
+        shared = object.__getattribute__(self, '_shared')
+        if shared:
+            shared.discard(key)
+
+    # dict methods that hand out values own shared values first
+    def get(self, key, default=None):
+        if dict.__contains__(self, key):
+            return self._own(key)
+        return default
+
+    def items(self):
+        self._own_all()
+        return dict.items(self)
+
+    def values(self):
+        self._own_all()
+        return dict.values(self)
+
+    def pop(self, key, *default):
+        self._check_writable()
+        if dict.__contains__(self, key):
+            self._own(key)
+        return dict.pop(self, key, *default)
+
+    def popitem(self):
+        self._check_writable()
+        self._own_all()
+        return dict.popitem(self)
+
+    def setdefault(self, key, default=None):
+        if dict.__contains__(self, key):
+            return self._own(key)
+        self._check_writable()
+        return dict.setdefault(self, key, default)
+
+    def clear(self):
+        self._check_writable()
+        dict.clear(self)
+        object.__setattr__(self, '_shared', None)
+
+    def copy(self):
+        '''A shallow copy as a plain dict, like `dict.copy`'''
+        self._own_all()
+        return dict.copy(self)
+
+    def __iter__(self):
+        # dict(), {**d} and dict.update only copy the raw items of dicts
+        # that don't define __iter__, otherwise they use keys() and [],
+        # which own the shared values
+        return dict.__iter__(self)
 
     def __copy__(self, *args, **kwargs):
         # necessary because of recursive errors
         return self.__class__(self)
 
-    def __deepcopy__(self, *args, **kwargs):
-        # necessary because of recursive errors
-        return self.__class__({key: deepcopy(value) for (key, value)
-                               in self.items()})
+    def __deepcopy__(self, memo=None):
+        # primitives and values that are still shared need no copy, read
+        # only values are shared with the copy until it looks them up
+        new = self.__class__()
+        shared = set(object.__getattribute__(self, '_shared') or ())
+        for key, value in dict.items(self):
+            if key in shared or type(value) in _PRIMITIVES or value is None:
+                pass
+            elif isinstance(value, _FREEZABLE) and \
+                    object.__getattribute__(value, '_readonly'):
+                _pin(value)
+                shared.add(key)
+            else:
+                value = deepcopy(value, memo)
+            dict.__setitem__(new, key, value)
+        if shared:
+            object.__setattr__(new, '_shared', shared)
+        return new
+
+    def __reduce__(self):
+        # the slots and the items, not the attribute machinery
+        shared = object.__getattribute__(self, '_shared')
+        try:
+            convert = object.__getattribute__(self, '_convert')
+        except AttributeError:
+            convert = None  # not a TypedDict
+        return (_unpickle_dict,
+                (type(self), dict(dict.items(self)), bool(self._readonly),
+                 tuple(shared) if shared else None, convert),
+                getattr(self, '__dict__', None) or None)
 
     def __basic__(self):
         '''returns self in only basic python types.
@@ -184,13 +424,15 @@ class SolidDict(AttrDict):
     '''Dictionary like object that doesn't allow it's shape to change
     (cannot add or remove keys)
     Does the same for all items inside of it'''
+    __slots__ = ()
+
     def __setitem__(self, item, value):
         if item not in self:
             raise KeyError(item)
         AttrDict.__setitem__(self, item, value)
 
     def __setattr__(self, attr, value, *args, **kwargs):
-        if not hasattr(self, attr):
+        if not (dict.__contains__(self, attr) or self._is_attr(attr)):
             raise AttributeError(attr)
         AttrDict.__setattr__(self, attr, value, *args, **kwargs)
 
@@ -202,10 +444,28 @@ class TypedDict(AttrDict):
     Keyword arguments:
         convert -- whether to attempt to convert values that don't match
     '''
+    __slots__ = ('_convert', '_compiled', '_fingerprint', '_origin')
+
     def __init__(self, *args, convert=True, **kwargs):
         object.__setattr__(self, '_convert', convert)
         super().__init__(*args, **kwargs)
 
+    def __reduce__(self):
+        '''Read only templates are pickled with their fingerprint and
+        configs made from one (see `compile_template`) as that template and
+        the values that differ from its defaults'''
+        if self._readonly:
+            reduced = AttrDict.__reduce__(self)
+            return (_unpickle_template, (fingerprint(self), reduced[1]),
+                    reduced[2])
+        try:
+            origin = object.__getattribute__(self, '_origin')
+            if origin._readonly and type(_attrs(type(self))) is frozenset:
+                return (_unpickle_config, (origin, _overrides(self, origin)))
+        except (AttributeError, KeyError):
+            pass
+        return AttrDict.__reduce__(self)
+
     def _convert_value(self, value, curval):
         '''Convert value to type(curvalue). Also do associated error checking'''
         curtype = type(curval)
@@ -223,31 +483,84 @@ class TypedDict(AttrDict):
         self.__setattr__(item, value, keyonly=True)
 
     def __setattr__(self, attr, value, keyonly=False):
-        if keyonly:
-            actual = self._get_item(attr)
+        isattr = not keyonly and self._is_attr(attr)
+        if not isattr and object.__getattribute__(self, '_readonly'):
+            # checked before descriptors change themselves
+            raise TypeError('{} is read only'.format(self))
+        if isattr:
+            actual = object.__getattribute__(self, attr)
         else:
-            actual = self._get_attr(attr)
-        if hasattr(actual, '__set__'):
-            actual.__set__(None, value)
+            actual = AttrDict._own(self, attr)
+        set_ = _descriptor(type(actual))[1]
+        if set_ is not None:
+            set_(actual, None, value)
             return
         value = self._convert_value(value, actual)
-        AttrDict.__setattr__(self, attr, value, keyonly)
+        AttrDict.__setattr__(self, attr, value, not isattr)
+
+    @AttrDict.readonly.setter
+    def readonly(self, value):
+        AttrDict.readonly.fset(self, value)
+        if not value:
+            # cached for read only templates, which no longer are
+            for attr in ('_fingerprint', '_compiled'):
+                try:
+                    object.__delattr__(self, attr)
+                except AttributeError:
+                    pass
+
+    def __hash__(self):
+        '''Read only trees (templates) hash by their fingerprint. Hashing
+        pins them, they stay read only so they can't change their hash'''
+        if not self._readonly:
+            raise TypeError("unhashable type: '{}' that is not read "
+                            "only".format(type(self).__name__))
+        _pin(self)
+        return hash(fingerprint(self))
+
+    def __eq__(self, other):
+        '''Read only trees compare by fingerprint, like they hash. Trees of
+        different types (a timedelta and an object) are never equal'''
+        if isinstance(other, _LazyTemplate):
+            other = other.load()
+        if isinstance(other, TypedDict):
+            if self._readonly and other._readonly:
+                return fingerprint(self) == fingerprint(other)
+            if getattr(type(self), 'TYPE', 'object') != \
+                    getattr(type(other), 'TYPE', 'object'):
+                return False
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
 
     def __set__(self, obj, value):
         raise TypeError("TypedDict is a protected member")
 
 
-class TypedList(list):
+class TypedList(list, metaclass=_Watched):
     '''A list that preserves types
         type: the type of list elements to preserve
         convert: whether to attempt automatic conversion to type
         noset: don't allow setting of existing elements
     '''
+    __slots__ = ('_type', '_convert', '_noset', '_readonly')
+
+    def __new__(cls, *args, **kwargs):
+        # lists of int, float and bool are kept in an array
+        kind = args[0] if args else kwargs.get('type')
+        if cls is TypedList and isinstance(kind, type) and \
+                kind in TypedArray.CODES:
+            cls = TypedArray
+        return list.__new__(cls)
+
     def __init__(self, type, *args, convert=True, noset=False,
                  drop_unknown=False, drop_logger=None, **kwargs):
         self._type = type
         self._convert = convert
         self._noset = noset
+        self._readonly = False
         list.__init__(self)  # make self an empty list
         convert = self._convert
         self.extend(tuple(*args, **kwargs), drop_unknown=drop_unknown,
@@ -264,14 +577,54 @@ class TypedList(list):
             out.append(value)
         return out
 
+    def __reduce__(self):
+        return (_unpickle_list, (type(self), self._type,
+                                 list(list.__iter__(self)), self._convert,
+                                 self._noset, bool(self._readonly)))
+
+    @property
+    def readonly(self):
+        '''doesn't allow changes, to the elements either'''
+        return bool(self._readonly)
+
+    @readonly.setter
+    def readonly(self, value):
+        if self._readonly == _PINNED:
+            if not value:
+                raise TypeError('{} is shared and stays read only, change '
+                                'a deepcopy of it'.format(type(self).__name__))
+            return
+        self._readonly = bool(value)
+        if value and isinstance(self._type, _LazyTemplate):
+            self._type = self._type.load()  # already pinned
+        if isinstance(self._type, _FREEZABLE):
+            _pin(self._type)  # shared by copies, never unfrozen
+        for index, nested in enumerate(list.__iter__(self)):
+            if not isinstance(nested, _FREEZABLE):
+                continue
+            if value or nested._readonly != _PINNED:
+                nested.readonly = value
+            else:
+                list.__setitem__(self, index, deepcopy(nested))
+
+    def _check_writable(self):
+        if self._readonly:
+            raise TypeError('{} is read only'.format(self))
+
     def update(self, value, **kwargs):
-        new = TypedList(self._type, value, **kwargs)  # check types
-        self.clear()
-        self.extend(new, **kwargs)
+        self._check_writable()
+        new = [self._convert_value(v, **kwargs) for v in value]  # check types
+        list.clear(self)
+        list.extend(self, new)
 
     def _convert_value(self, value, **kwargs):
         '''Automatic type conversion. Uses update if it exists'''
-        if hasattr(self._type, 'update'):
+        if isinstance(self._type, _LazyTemplate):
+            # loaded once by the placeholder, the list is left as it is
+            return compile_template(self._type.load())(value, **kwargs)
+        if isinstance(self._type, TypedDict):
+            return compile_template(self._type)(value, **kwargs)
+        elif hasattr(self._type, 'update'):
             # Copy our type (think of it is a template)
             _type = deepcopy(self._type)
             # update the values. Values not included will remain as the default
@@ -286,6 +639,7 @@ class TypedList(list):
 
     def append(self, value, **kwargs):
         '''Append a value. It is type checked first'''
+        self._check_writable()
         value = self._convert_value(value, **kwargs)
         list.append(self, value)
 
@@ -297,14 +651,266 @@ class TypedList(list):
     def __setitem__(self, item, value):
         if self._noset:
             raise IndexError("items cannot be set with noset=True")
+        self._check_writable()
         value = self._convert_value(value)
         list.__setitem__(self, item, value)
 
+    # the list methods that change it, checked for read only lists
+    def insert(self, index, value):
+        self._check_writable()
+        list.insert(self, index, value)
+
+    def __delitem__(self, index):
+        self._check_writable()
+        list.__delitem__(self, index)
+
+    def pop(self, index=-1):
+        self._check_writable()
+        return list.pop(self, index)
+
+    def remove(self, value):
+        self._check_writable()
+        list.remove(self, value)
+
+    def clear(self):
+        self._check_writable()
+        list.clear(self)
+
+    def reverse(self):
+        self._check_writable()
+        list.reverse(self)
+
+    def sort(self, *args, **kwargs):
+        self._check_writable()
+        list.sort(self, *args, **kwargs)
+
+    def __iadd__(self, other):
+        self.extend(other)
+        return self
+
+    def __imul__(self, count):
+        self._check_writable()
+        return list.__imul__(self, count)
+
     def __set__(self, obj, value):
         raise TypeError("Typed List is a protected member")
 
+    def __deepcopy__(self, memo=None):
+        # the element template is never changed, so share it
+        new = list.__new__(type(self))
+        new._type = self._type
+        new._convert = self._convert
+        new._noset = self._noset
+        new._readonly = False
+        list.extend(new, [v if type(v) in _PRIMITIVES else deepcopy(v, memo)
+                          for v in list.__iter__(self)])
+        return new
+
+
+class TypedArray(TypedList):
+    '''A TypedList of int, float or bool kept in a compact `array.array`.
+
+    `TypedList(int)` (or float or bool) creates one. Values are converted
+    in bulk with no Python call per item, and arrays of the same type are
+    copied as a block. Ints that don't fit in 64 bits switch the store to
+    a plain list. `json` iterates over list subclasses, so it writes the
+    items like those of a list; `dumps` goes through `__basic__` like for
+    every properties type. Adding it to or with a list gives a plain list.
+    '''
+    __slots__ = ('_array',)
+    CODES = {int: 'q', float: 'd', bool: 'b'}
+
+    def __init__(self, type, values=(), convert=True, noset=False,
+                 drop_unknown=False, drop_logger=None):
+        self._type = type
+        self._convert = convert
+        self._noset = noset
+        self._readonly = False
+        self._array = array(self.CODES[type])
+        self.extend(values)
+
+    def _convert_many(self, values):
+        '''Convert values to the element type, as an array if possible'''
+        code = self.CODES[self._type]
+        if isinstance(values, array) and values.typecode == code and \
+                self._type is not bool:
+            return values
+        if isinstance(values, memoryview):
+            values = values.tolist()
+        values = list(map(self._type, values))
+        try:
+            return array(code, values)
+        except OverflowError:
+            return values
+
+    def _store(self, values):
+        '''The store to put `values` in, a list if they need one'''
+        if isinstance(self._array, array) and not isinstance(values, array):
+            self._array = self._array.tolist()
+        return self._array
+
+    def _box(self, values):
+        return map(bool, values) if self._type is bool else iter(values)
+
+    def append(self, value, **kwargs):
+        self.extend((value,))
+
+    def extend(self, values, **kwargs):
+        self._check_writable()
+        values = self._convert_many(values)
+        self._store(values).extend(values)
+
+    def insert(self, index, value):
+        self._check_writable()
+        values = self._convert_many((value,))
+        self._store(values).insert(index, values[0])
+
+    def update(self, value, **kwargs):
+        self._check_writable()
+        values = self._convert_many(value)
+        self._array = values[:] if values is value else values
+
+    def __setitem__(self, index, value):
+        if self._noset:
+            raise IndexError("items cannot be set with noset=True")
+        self._check_writable()
+        values = self._convert_many(value if isinstance(index, slice)
+                                    else (value,))
+        store = self._store(values)
+        if isinstance(index, slice):
+            store[index] = values
+        else:
+            store[index] = values[0]
+
+    def __getitem__(self, index):
+        value = self._array[index]
+        if isinstance(index, slice):
+            return list(self._box(value))
+        return bool(value) if self._type is bool else value
+
+    def __delitem__(self, index):
+        self._check_writable()
+        del self._array[index]
+
+    def __len__(self):
+        return len(self._array)
+
+    def __iter__(self):
+        return self._box(self._array)
+
+    def __reversed__(self):
+        return self._box(reversed(self._array))
+
+    def __contains__(self, value):
+        return value in self._array
+
+    def pop(self, index=-1):
+        self._check_writable()
+        value = self._array.pop(index)
+        return bool(value) if self._type is bool else value
+
+    def remove(self, value):
+        self._check_writable()
+        self._array.remove(value)
+
+    def index(self, value, *args):
+        return list(self).index(value, *args)
+
+    def count(self, value):
+        return self._array.count(value)
+
+    def clear(self):
+        self._check_writable()
+        del self._array[:]
+
+    def copy(self):
+        return list(self)
+
+    def reverse(self):
+        self._check_writable()
+        self._array.reverse()
+
+    def sort(self, key=None, reverse=False):
+        self._check_writable()
+        self._array[:] = self._convert_many(sorted(self, key=key,
+                                                   reverse=reverse))
+
+    def __eq__(self, other):
+        return list(self) == other
+
+    def __ne__(self, other):
+        return list(self) != other
+
+    def __lt__(self, other):
+        return list(self) < other
+
+    def __le__(self, other):
+        return list(self) <= other
+
+    def __gt__(self, other):
+        return list(self) > other
+
+    def __ge__(self, other):
+        return list(self) >= other
+
+    __hash__ = None
+
+    def __add__(self, other):
+        if not isinstance(other, list):
+            return NotImplemented
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        # list + TypedArray would only see the empty list storage
+        if not isinstance(other, list):
+            return NotImplemented
+        return list(other) + list(self)
+
+    def __iadd__(self, other):
+        if isinstance(other, (str, bytes, dict)) or \
+                not hasattr(other, '__iter__'):
+            return NotImplemented
+        self.extend(other)
+        return self
+
+    def __mul__(self, count):
+        return list(self) * count
+
+    __rmul__ = __mul__
+
+    def __imul__(self, count):
+        self._check_writable()
+        self._array *= count
+        return self
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def __sizeof__(self):
+        return list.__sizeof__(self) + sys.getsizeof(self._array)
+
+    def __basic__(self):
+        if self._type is bool:
+            return list(map(bool, self._array))
+        return list(self._array)
+
+    def __deepcopy__(self, memo=None):
+        new = list.__new__(type(self))
+        for attr in ('_type', '_convert', '_noset'):
+            object.__setattr__(new, attr, getattr(self, attr))
+        new._readonly = False
+        new._array = self._array[:]
+        return new
 
-class TypedEnum:
+    __copy__ = __deepcopy__
+
+    def __reduce__(self):
+        # arrays pickle as the bytes of their items
+        return (_unpickle_list, (type(self), self._type, self._array,
+                                 self._convert, self._noset, self._readonly))
+
+
+class TypedEnum(metaclass=_Watched):
     '''Class to make setting of enum types valid and error checked
 
     This class can be put in a Typed object. It allows you to reduce
@@ -319,12 +925,11 @@ class TypedEnum:
 
     See the unit tests for more examples
     '''
+    __slots__ = ('_table', '_value')
+
     def __init__(self, enum, default=None):
-        self._enum = enum
-        self._enum_by_value = {e.value: e for e in enum}
-        self._enum_by_name = {e.name: e for e in enum}
-        self._enum_dict = {e.name: e.value for e in enum}
-        self._value = next(iter(enum))
+        self._table = _enum_table(enum)
+        self._value = self._table.first
         if default is not None:
             self.value = default
 
@@ -334,15 +939,22 @@ class TypedEnum:
 
     @value.setter
     def value(self, value):
-        if value in self._enum:
-            value = getattr(self._enum, value.name)
-        elif value in self._enum_by_name:
-            value = self._enum_by_name[value]
-        elif value in self._enum_by_value:
-            value = self._enum_by_value[value]
+        table = self._table
+        if isinstance(value, table.enum):
+            member = getattr(table.enum, value.name)
         else:
-            raise ValueError("Value does not exist in enum: {}".format(value))
-        self._value = value
+            try:
+                member = table.by_name.get(value)
+                if member is None:
+                    member = table.by_value.get(value)
+            except TypeError:
+                member = None  # unhashable, compared one by one below
+            if member is None:
+                member = table.find(value)
+            if member is None:
+                raise ValueError(
+                    "Value does not exist in enum: {}".format(value))
+        self._value = member
 
     @property
     def name(self):
@@ -350,7 +962,14 @@ class TypedEnum:
 
     def __repr__(self):
         return "Enum(value={}, possible={})".format(self._value.name,
-                                                    self._enum_dict)
+                                                    self._table.options)
+
+    def __eq__(self, other):
+        if not isinstance(other, TypedEnum):
+            return NotImplemented
+        return self._table is other._table and self._value is other._value
+
+    __hash__ = None
 
     def __get__(self, obj, type=None):
         return self._value.name
@@ -360,20 +979,234 @@ class TypedEnum:
             value = value.__get__(None, None)
         self.value = value
 
+    def __copy__(self):
+        # the enum and its lookup tables are never changed, so share them
+        new = TypedEnum.__new__(TypedEnum)
+        new._table = self._table
+        new._value = self._value
+        return new
+
+    def __deepcopy__(self, memo=None):
+        return self.__copy__()
+
+    def __reduce__(self):
+        # enums made from options (see interned_enum) can't be imported,
+        # they are made again from their options
+        table = self._table
+        enum = table.enum
+        if not _importable(enum):
+            enum = tuple(table.options.items())
+        return (_unpickle_enum, (enum, self._value.name))
+
+
+class _EnumTable(object):
+    '''An enum class and its lookup tables, shared by all its TypedEnums'''
+    __slots__ = ('enum', 'first', 'by_value', 'by_name', 'options',
+                 'unhashable')
+
+    def __init__(self, enum):
+        self.enum = enum
+        self.first = next(iter(enum))
+        self.by_value = {}
+        self.unhashable = []  # members whose value can't be a key
+        for e in enum:
+            try:
+                self.by_value[e.value] = e
+            except TypeError:
+                self.unhashable.append(e)
+        self.by_name = {e.name: e for e in enum}
+        self.options = {e.name: e.value for e in enum}
+
+    def find(self, value):
+        '''The member with an unhashable value equal to `value`, or None'''
+        for member in self.unhashable:
+            if member.value == value:
+                return member
+        return None
+
+
+_ENUM_CACHE_SIZE = 1024  # enum classes and tables kept by the caches below
+_enum_tables = OrderedDict()  # enum class: _EnumTable
+_interned_enums = OrderedDict()  # options as a tuple of items: enum class
+_enum_lock = threading.Lock()
+
+
+def _cached(cache, key, make):
+    '''`cache[key]`, made first if needed. Caches keep the most recently
+    used `_ENUM_CACHE_SIZE` entries'''
+    with _enum_lock:
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+            return value
+    value = make()
+    with _enum_lock:
+        value = cache.setdefault(key, value)
+        while len(cache) > _ENUM_CACHE_SIZE:
+            cache.popitem(last=False)
+    return value
+
+
+def _enum_table(enum):
+    return _cached(_enum_tables, enum, lambda: _EnumTable(enum))
+
+
+def interned_enum(options):
+    '''The enum class of a select's options, shared by equal option sets.
+
+    Options are a dictionary of names to values, and their order counts.
+    Options with unhashable values get an enum class of their own.
+    '''
+    key = tuple(options.items())
+    try:
+        hash(key)
+    except TypeError:
+        return Enum('NioEnum', key)
+    return _cached(_interned_enums, key, lambda: Enum('NioEnum', key))
+
+
+def _importable(cls):
+    '''Whether pickle can find `cls` by its name'''
+    found = sys.modules.get(cls.__module__)
+    for name in cls.__qualname__.split('.'):
+        found = getattr(found, name, None)
+    return found is cls
+
+
+def check(template, config):
+    '''Check a config against a loaded template without changing either.
+
+    Every top level property is set on its own, so all invalid properties
+    are found at once. Properties the template doesn't know are ignored.
+
+    Returns a list of (key, exception) for every invalid property
+    '''
+    converter = compile_template(template)
+    typed = converter.new()
+    errors = []
+    for key, value in config.items():
+        if key not in typed:
+            continue
+        try:
+            converter.apply(typed, [(key, value)])
+        except (TypeError, ValueError, KeyError, AttributeError) as e:
+            errors.append((key, e))
+    return errors
+
+
+def validate_batch(template, rows, drop_unknown=True, chunk_size=1000):
+    '''Check and type many configs against one loaded template.
+
+    Rows are read `chunk_size` at a time, so `rows` can be any iterable,
+    including a generator over a file too big to load at once. Within a
+    chunk every property is converted for all rows before the next one
+    (column by column) using the template's compiled converter.
+
+    Args:
+        template (TypedDict): Loaded template.
+        rows (iterable of dict): Raw configs.
+        drop_unknown (bool, optional): Ignore properties the template
+            doesn't know. Otherwise they are reported as errors.
+        chunk_size (int, optional): Number of rows held in memory.
+
+    Yields:
+        tuple: (config, errors) for every row, in order. `config` is the
+            typed config, or None if the row had errors. `errors` is a list
+            of (key, exception) like `check` returns.
+    '''
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    converter = compile_template(template)
+    setters = converter._setters
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        configs = [converter.new() for _ in chunk]
+        errors = [[] for _ in chunk]
+        valid = []  # (index, row) of the rows that are dictionaries
+        for index, row in enumerate(chunk):
+            if isinstance(row, dict):
+                valid.append((index, row))
+                if not drop_unknown:
+                    errors[index].extend((key, KeyError(key)) for key
+                                         in row if key not in setters)
+            else:
+                errors[index].append((None, TypeError(
+                    "{!r} is not a config".format(row))))
+        for key, setter in setters.items():
+            for index, row in valid:
+                if key not in row:
+                    continue
+                try:
+                    setter(configs[index], key, row[key], drop_unknown, None)
+                except (TypeError, ValueError, KeyError,
+                        AttributeError) as e:
+                    errors[index].append((key, e))
+        for config, errs in zip(configs, errors):
+            yield (None if errs else config), errs
+
+
+def diff(old, new):
+    '''JSON merge patch (RFC 7386) that turns `old` into `new`.
+
+    Both arguments are basic python types (see `__basic__`). Dictionaries
+    are compared key by key, everything else is replaced as a whole.
+    Removed keys are set to None. Returns an empty dict if nothing changed,
+    and None if the change can't be expressed as a merge patch: a field
+    that is set to None would be deleted, so the whole config has to be
+    sent instead.
+    '''
+    patch = {}
+    for key, value in new.items():
+        if key not in old:
+            if _has_null(value):
+                return None
+            patch[key] = value
+            continue
+        oldvalue = old[key]
+        if isinstance(value, dict) and isinstance(oldvalue, dict):
+            sub = diff(oldvalue, value)
+            if sub is None:
+                return None
+            if sub:
+                patch[key] = sub
+        elif value != oldvalue or type(value) != type(oldvalue):
+            if _has_null(value):
+                return None
+            patch[key] = value
+    for key in old:
+        if key not in new:
+            patch[key] = None
+    return patch
+
+
+def _has_null(value):
+    '''Whether a merge patch would read part of `value` as a deletion'''
+    if value is None:
+        return True
+    if isinstance(value, dict):
+        return any(_has_null(v) for v in value.values())
+    return False  # lists are replaced as a whole, nulls in them are kept
+
 
 '''
 Additional Properties for possible future type checking. Not currently
     necessary -- TypedDict could be used for all of these
 '''
 class Properties(TypedDict):
+    __slots__ = ()
     TYPE = 'properties'
 
 
 class TimeDelta(TypedDict):
+    __slots__ = ()
     TYPE = 'timedelta'
 
 
 class NioObject(TypedDict):
+    __slots__ = ()
     TYPE = 'object'
 
 TypedList.TYPE = 'list'
@@ -384,19 +1217,138 @@ TypedEnum.TYPE = 'select'
 
 def load_block(template, type=None):
     '''Parsing function to load a block from a template dictionary'''
-    template = deepcopy(template)
+    template = _copy_raw(template)
     config = load_properties(template['properties'])
     if type is not None:
         config.type = type
     return config
 
 
+def _copy_raw(template):
+    '''Copy a raw (json) template, a lot faster than deepcopy'''
+    kind = type(template)
+    if kind is dict:
+        return {key: _copy_raw(value) for (key, value) in template.items()}
+    if kind is list:
+        return [_copy_raw(value) for value in template]
+    if kind in _PRIMITIVES or template is None:
+        return template
+    return deepcopy(template)
+
+
 def load_properties(properties, obj=Properties):
     '''Used for loading templates that are dictionary-like'''
     out = {}
     for key, value in properties.items():
         out[key] = load_template(value)
-    return obj(out)
+    out = obj(out)
+    lazy = {key for (key, value) in dict.items(out)
+            if isinstance(value, _LazyTemplate)}
+    if lazy:
+        # loaded when first looked up, like shared values
+        object.__setattr__(out, '_shared', lazy)
+    return out
+
+
+class _LazyTemplate(object, metaclass=_Watched):
+    '''A nested object template that is loaded when it is first used.
+
+    It keeps the raw properties of an 'object' template. Its parent lists
+    its key with the shared keys (see `AttrDict`), so looking it up
+    through a writable parent replaces it with a loaded copy, and freezing
+    the parent replaces it with the loaded (read only) template. Read only
+    trees never hold one. `__basic__` is computed from the raw template
+    without loading it.
+    '''
+    __slots__ = ('_raw', '_loaded', '_basic')
+
+    def __init__(self, raw):
+        self._raw = raw
+        self._loaded = None
+        self._basic = None
+
+    def load(self):
+        '''The loaded template. It is shared, so it is read only'''
+        loaded = self._loaded
+        if loaded is None:
+            with _lazy_lock:
+                loaded = self._loaded
+                if loaded is None:
+                    loaded = load_properties(self._raw, NioObject)
+                    _pin(loaded)
+                    self._loaded = loaded
+                    self._raw = None
+        return loaded
+
+    def __deepcopy__(self, memo=None):
+        return deepcopy(self.load(), memo)
+
+    def __basic__(self):
+        if self._basic is None:
+            raw = self._raw
+            if raw is None:
+                return self._loaded.__basic__()
+            self._basic = _basic_defaults(raw)
+        return _copy_raw(self._basic)
+
+    def __eq__(self, other):
+        if isinstance(other, _LazyTemplate):
+            other = other.load()
+        return self.load() == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(self.load())
+
+    def __reduce__(self):
+        raw = self._raw
+        if raw is not None:
+            return (_LazyTemplate, (raw,))
+        return (_unpickle_lazy, (self._loaded,))
+
+
+_lazy_lock = threading.RLock()  # freezing a loaded template loads its own
+_FREEZABLE = (AttrDict, TypedList)  # see AttrDict.readonly
+_PINNED = 2  # `_readonly` of trees that stay read only for good
+
+
+def _pin(obj):
+    '''Freeze a tree for good, it is shared with other trees.
+
+    Nested values are pinned as well, since the tree hands them out as they
+    are. Trees that are already pinned are not walked again.
+    '''
+    if object.__getattribute__(obj, '_readonly') == _PINNED:
+        return
+    obj.readonly = True
+    object.__setattr__(obj, '_readonly', _PINNED)
+    if isinstance(obj, AttrDict):
+        nested = dict.values(obj)
+    else:
+        nested = list.__iter__(obj)
+        if isinstance(obj._type, _FREEZABLE):
+            _pin(obj._type)
+    for value in nested:
+        if isinstance(value, _FREEZABLE):
+            _pin(value)
+
+
+def _basic_defaults(properties):
+    '''`__basic__` of what raw object properties load into'''
+    out = {}
+    for key, value in properties.items():
+        if isinstance(value, dict) and \
+                value.get('type') == NioObject.TYPE and 'template' in value:
+            out[key] = _basic_defaults(value['template'])
+            continue
+        value = load_template(value)
+        if hasattr(value, '__basic__'):
+            value = value.__basic__()
+        elif hasattr(value, '__get__'):
+            value = value.__get__(None, None)
+        out[key] = value
+    return out
 
 
 # Functions to go into PROPERTIES
@@ -410,6 +1362,7 @@ def load_template(template):
     except TypeError:
         hastype = False
     if hastype:
+        template = dict(template)  # the raw template is left as it is
         ttype = template.pop('type')
         load_function = PROPERTIES[ttype]
         if 'template' in template or 'options' in template:
@@ -448,10 +1401,10 @@ def load_list(template):
 # Define all the properties and how to load them when you get their dict
 PROPERTIES = {
     TimeDelta.TYPE: lambda p: TimeDelta(p),
-    TypedEnum.TYPE: lambda p: TypedEnum(Enum('NioEnum', p['options'].items()),
+    TypedEnum.TYPE: lambda p: TypedEnum(interned_enum(p['options']),
                                         p['default']),
     TypedList.TYPE: load_list,
-    NioObject.TYPE: lambda p: load_properties(p['template'], NioObject),
+    NioObject.TYPE: lambda p: _LazyTemplate(p['template']),
     'bool': bool,
     'str': str,
     'expression': str,
@@ -459,3 +1412,609 @@ PROPERTIES = {
     'int': int,
     'float': float
 }
+
+
+'''JSON encoding of properties trees.'''
+
+def _floatstr(value):
+    '''A float as json writes it'''
+    if value != value:
+        return 'NaN'
+    if value == _INFINITY:
+        return 'Infinity'
+    if value == -_INFINITY:
+        return '-Infinity'
+    return float.__repr__(value)
+
+
+_INFINITY = float('inf')
+_LITERALS = {True: 'true', False: 'false', None: 'null'}
+
+
+def _keystr(key):
+    '''A dictionary key as json writes it'''
+    if isinstance(key, str):
+        return encode_basestring_ascii(key)
+    if key is True or key is False or key is None:
+        return '"{}"'.format(_LITERALS[key])
+    if isinstance(key, float):
+        return '"{}"'.format(_floatstr(key))
+    if isinstance(key, int):
+        return '"{}"'.format(int.__repr__(key))
+    raise TypeError("keys must be str, int, float, bool or None, "
+                    "not {}".format(type(key).__name__))
+
+
+def _leaf(value, parent):
+    '''Encode a value that is not a container, or return None'''
+    kind = type(value)
+    if kind is str:
+        return encode_basestring_ascii(value)
+    if value is None or value is True or value is False:
+        return _LITERALS[value]
+    if kind is int:
+        return int.__repr__(value)
+    if kind is float:
+        return _floatstr(value)
+    if isinstance(value, (AttrDict, TypedList, dict, list, tuple)):
+        return None
+    if hasattr(value, '__basic__'):
+        return None
+    if hasattr(value, '__get__'):
+        return _leaf(value.__get__(parent, type(parent)), parent)
+    if isinstance(value, str):
+        return encode_basestring_ascii(value)
+    if isinstance(value, int):
+        return int.__repr__(value)
+    if isinstance(value, float):
+        return _floatstr(value)
+    raise TypeError("Object of type {} is not JSON serializable".format(
+        type(value).__name__))
+
+
+def _encode(obj, out, chunk):
+    '''Append the json of `obj` to `out`, yielding when it should be sent'''
+    if isinstance(obj, TypedArray):
+        store = obj._array
+        if not store:
+            out.append('[]')
+            return
+        for start in range(0, len(store), chunk):
+            part = store[start:start + chunk]
+            part = json.dumps(list(map(bool, part)) if obj._type is bool
+                              else list(part))
+            out.append(('[' if start == 0 else ', ') + part[1:-1])
+            yield
+        out.append(']')
+        return
+    if isinstance(obj, dict):
+        if not obj:
+            out.append('{}')
+            return
+        sep = '{'
+        for key in obj:
+            value = dict.__getitem__(obj, key)
+            out.append(sep)
+            out.append(_keystr(key))
+            out.append(': ')
+            sep = ', '
+            encoded = _leaf(value, obj)
+            if encoded is None:
+                yield from _encode(value, out, chunk)
+            else:
+                out.append(encoded)
+        out.append('}')
+    elif isinstance(obj, (list, tuple)):
+        values = list.__iter__(obj) if isinstance(obj, list) else obj
+        sep = '['
+        for value in values:
+            out.append(sep)
+            sep = ', '
+            encoded = _leaf(value, obj)
+            if encoded is None:
+                yield from _encode(value, out, chunk)
+            else:
+                out.append(encoded)
+        out.append('[]' if sep == '[' else ']')
+    elif hasattr(obj, '__basic__'):
+        yield from _encode(obj.__basic__(), out, chunk)
+        return
+    else:
+        out.append(_leaf(obj, None))
+        return
+    if len(out) >= chunk:
+        yield
+
+
+def iterencode(obj, chunk=4096):
+    '''Encode a properties tree to json, piece by piece.
+
+    The pieces joined are exactly `json.dumps(obj.__basic__())`, but the
+    tree is not copied first. A piece is made every `chunk` values or so,
+    so big configs never have to be held in memory as one string.
+    '''
+    out = []
+    for _ in _encode(obj, out, chunk):
+        yield ''.join(out)
+        out.clear()
+    if out:
+        yield ''.join(out)
+
+
+def dumps(obj):
+    '''`json.dumps(obj.__basic__())` without copying the tree first'''
+    return ''.join(iterencode(obj))
+
+
+'''Cache of loaded templates shared by all instances.'''
+
+class TemplateCache(object):
+    '''Bounded LRU cache of loaded, read only block templates.
+
+    Templates are keyed by a hash of their canonical JSON, so identical
+    templates fetched from different instances are loaded once and the
+    same template object (and its compiled converter) is handed out to
+    everyone. Cached templates are read only all the way down, and they
+    hash by their fingerprint, so they can be dictionary keys.
+
+    Keyword arguments:
+        maxsize -- number of templates to keep, least recently used ones
+            are dropped first
+    '''
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key: (template, bytes)
+        self._fingerprints = OrderedDict()  # fingerprint: template
+
+    @staticmethod
+    def key(template, type=None, name=None):
+        '''Hash of the canonical JSON of a raw template'''
+        data = json.dumps([template, type, name], sort_keys=True,
+                          separators=(',', ':'), default=str)
+        return hashlib.sha1(data.encode()).hexdigest()
+
+    def load(self, template, type=None, name=None):
+        '''Return the loaded, read only template of a raw block template.
+
+        `type` and `name` are set on the loaded template if given. It is
+        shared by every caller, so it stays read only for good; deepcopy
+        it or use `compile_template` for a writable tree.
+        '''
+        key = self.key(template, type, name)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        loaded = load_block(template, type)
+        if name is not None:
+            loaded.name = name
+        _pin(loaded)
+        with self._lock:
+            # another thread may have loaded it meanwhile, keep the first
+            entry = self._entries.setdefault(key, (loaded, _sizeof(loaded)))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry[0]
+
+    def add(self, template):
+        '''Keep a loaded, read only template so `find` can return it.
+
+        Returns the template kept for its fingerprint, which is an equal
+        template added before if there is one. It stays read only for good.
+        '''
+        _pin(template)
+        key = fingerprint(template)
+        with self._lock:
+            kept = self._fingerprints.setdefault(key, template)
+            self._fingerprints.move_to_end(key)
+            while len(self._fingerprints) > self.maxsize:
+                self._fingerprints.popitem(last=False)
+        return kept
+
+    def find(self, key):
+        '''Return the template added with fingerprint `key`, or None'''
+        with self._lock:
+            template = self._fingerprints.get(key)
+            if template is not None:
+                self._fingerprints.move_to_end(key)
+            return template
+
+    def stats(self):
+        '''Hits, misses, hit rate, number of templates and their bytes'''
+        with self._lock:
+            total = self.hits + self.misses
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'hit_rate': self.hits / total if total else 0.0,
+                    'size': len(self._entries),
+                    'maxsize': self.maxsize,
+                    'bytes': sum(e[1] for e in self._entries.values())}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._fingerprints.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return 'TemplateCache({})'.format(self.stats())
+
+
+def _sizeof(obj, seen=None):
+    '''Approximate number of bytes used by a loaded template'''
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in dict.items(obj):
+            size += _sizeof(key, seen) + _sizeof(value, seen)
+    elif isinstance(obj, list):
+        for value in list.__iter__(obj):
+            size += _sizeof(value, seen)
+        if isinstance(obj, TypedList):
+            size += _sizeof(obj._type, seen)
+    elif isinstance(obj, _LazyTemplate):
+        size += _sizeof(obj._raw, seen) + _sizeof(obj._loaded, seen)
+    return size
+
+
+# templates loaded by any instance in this process
+templates = TemplateCache()
+
+
+'''Fingerprints and schema differences of loaded templates.'''
+
+SchemaChange = namedtuple('SchemaChange', 'path change old new')
+SchemaChange.__doc__ = '''A difference between two template schemas.
+
+`path` is the tuple of property names leading to the property, with '[]'
+for the elements of a list. `change` is one of 'added', 'removed',
+'retyped', 'options' or 'default', and `old` and `new` are the types,
+enum options or defaults before and after.
+'''
+
+
+def schema(template):
+    '''Describe the shape of a loaded template in basic python types.
+
+    Every property is described by its type and default, enums also by
+    their options, objects by their properties and lists by the template
+    of their elements.
+    '''
+    if isinstance(template, _LazyTemplate):
+        template = template.load()
+    if isinstance(template, AttrDict):
+        return {'type': getattr(type(template), 'TYPE', 'object'),
+                'properties': {key: schema(dict.__getitem__(template, key))
+                               for key in template}}
+    if isinstance(template, TypedList):
+        element = template._type
+        if isinstance(element, _LazyTemplate):
+            element = element.load()
+        return {'type': 'list',
+                'template': (schema(element) if isinstance(element, AttrDict)
+                             else {'type': element.__name__}),
+                'default': template.__basic__()}
+    if isinstance(template, TypedEnum):
+        return {'type': 'select', 'options': dict(template._table.options),
+                'default': template.name}
+    if hasattr(template, '__basic__'):
+        template = template.__basic__()
+    return {'type': type(template).__name__, 'default': template}
+
+
+def fingerprint(template):
+    '''Stable hash of the shape of a loaded template, see `schema`.
+
+    Templates with the same properties, types, defaults and enum options
+    have the same fingerprint, in any process. It is cached on read only
+    templates.
+    '''
+    try:
+        return object.__getattribute__(template, '_fingerprint')
+    except AttributeError:
+        pass
+    data = json.dumps(schema(template), sort_keys=True,
+                      separators=(',', ':'), default=str)
+    out = hashlib.sha1(data.encode()).hexdigest()
+    if isinstance(template, TypedDict) and template.readonly:
+        object.__setattr__(template, '_fingerprint', out)
+    return out
+
+
+def schema_diff(old, new):
+    '''List the differences between two loaded templates.
+
+    Returns a list of `SchemaChange`, empty if both have the same shape.
+    Properties whose type changed are reported as 'retyped' and not
+    compared any further.
+    '''
+    changes = []
+    _schema_diff(schema(old), schema(new), (), changes)
+    return changes
+
+
+def _schema_diff(old, new, path, changes):
+    if old['type'] != new['type']:
+        changes.append(SchemaChange(path, 'retyped', old['type'],
+                                    new['type']))
+        return
+    if 'properties' in old:
+        oldprops, newprops = old['properties'], new['properties']
+        for key in oldprops:
+            if key not in newprops:
+                changes.append(SchemaChange(path + (key,), 'removed',
+                                            oldprops[key]['type'], None))
+        for key in newprops:
+            if key not in oldprops:
+                changes.append(SchemaChange(path + (key,), 'added', None,
+                                            newprops[key]['type']))
+            else:
+                _schema_diff(oldprops[key], newprops[key], path + (key,),
+                             changes)
+        return
+    if 'template' in old:
+        _schema_diff(old['template'], new['template'], path + ('[]',),
+                     changes)
+    if old.get('options') != new.get('options'):
+        changes.append(SchemaChange(path, 'options', old['options'],
+                                    new['options']))
+    if old.get('default') != new.get('default'):
+        changes.append(SchemaChange(path, 'default', old.get('default'),
+                                    new.get('default')))
+
+
+'''Pickling of properties objects, see their `__reduce__`.'''
+
+def _unpickle_dict(cls, items, readonly, shared, convert):
+    out = dict.__new__(cls)
+    object.__setattr__(out, '_readonly', readonly)
+    object.__setattr__(out, '_shared', set(shared) if shared else None)
+    if convert is not None:
+        object.__setattr__(out, '_convert', convert)
+    dict.update(out, items)
+    return out
+
+
+def _unpickle_template(key, args):
+    # equal templates unpickle into one object, which compiles only once
+    template = templates.find(key)
+    if template is None:
+        template = _unpickle_dict(*args)
+        object.__setattr__(template, '_fingerprint', key)
+        template = templates.add(template)
+    return template
+
+
+def _overrides(config, template):
+    '''Merge patch (see `diff`) from a template to a config made from it.
+
+    Raises KeyError if the config doesn't have the shape of the template.
+    '''
+    if len(config) != len(template):
+        raise KeyError('config and template have different keys')
+    out = {}
+    for key, value in dict.items(config):
+        default = dict.__getitem__(template, key)
+        if value is default:
+            continue  # shared with the template by its converter
+        if type(value) is TypedEnum and type(default) is TypedEnum:
+            if value._value is not default._value:
+                out[key] = value._value.name
+            continue
+        if isinstance(default, _LazyTemplate):
+            default = default.load()
+        if isinstance(value, AttrDict) and isinstance(default, AttrDict):
+            value = _overrides(value, default)
+            if value:
+                out[key] = value
+            continue
+        if hasattr(value, '__basic__'):
+            value = value.__basic__()
+        elif hasattr(value, '__get__'):
+            value = value.__get__(config, type(config))
+        if hasattr(default, '__basic__'):
+            default = default.__basic__()
+        if value != default or type(value) is not type(default):
+            out[key] = value
+    return out
+
+
+def _unpickle_config(template, overrides):
+    return compile_template(template)(overrides)
+
+
+def _unpickle_list(cls, type, values, convert, noset, readonly):
+    out = list.__new__(cls)
+    for attr, value in (('_type', type), ('_convert', convert),
+                        ('_noset', noset), ('_readonly', readonly)):
+        object.__setattr__(out, attr, value)
+    if issubclass(cls, TypedArray):
+        out._array = values
+    else:
+        list.extend(out, values)
+    return out
+
+
+def _unpickle_enum(enum, name):
+    if isinstance(enum, tuple):
+        enum = interned_enum(dict(enum))
+    out = TypedEnum.__new__(TypedEnum)
+    out._table = _enum_table(enum)
+    out._value = out._table.by_name[name]
+    return out
+
+
+def _unpickle_lazy(loaded):
+    out = _LazyTemplate(None)
+    out._loaded = loaded
+    return out
+
+
+'''Compiled converters for loaded templates.'''
+
+def compile_template(template):
+    '''Return the `Converter` of a loaded template (a TypedDict).
+
+    The converter of a `readonly` template is built once and cached on it
+    (making it writable again drops the converter). Writable templates may
+    still change, so they get a new converter every time. Other templates
+    get a converter that copies and updates them.
+    '''
+    if not isinstance(template, TypedDict):
+        def generic(config=None, drop_unknown=False, drop_logger=None):
+            out = deepcopy(template)
+            out.readonly = False
+            if config:
+                out.update(config, drop_unknown=drop_unknown,
+                           drop_logger=drop_logger)
+            return out
+        return generic
+    try:
+        return object.__getattribute__(template, '_compiled')
+    except AttributeError:
+        converter = Converter(template)
+        if object.__getattribute__(template, '_readonly'):
+            object.__setattr__(template, '_compiled', converter)
+        return converter
+
+
+class Converter(object):
+    '''A template compiled into functions specialized for each property.
+
+    Calling a converter with a config gives the same typed tree as
+    deepcopying the template and updating the copy with the config, but
+    without the generic descriptor and attribute lookups of `AttrDict`.
+    Primitive defaults are shared, enums and lists are copied directly and
+    nested objects use their own converters.
+    '''
+    __slots__ = ('_template', '_class', '_convert', '_makers', '_setters',
+                 '_lazy')
+
+    def __init__(self, template):
+        self._template = template
+        self._class = type(template)
+        self._convert = template._convert
+        self._makers = []
+        self._setters = {}
+        self._lazy = []  # keys of nested templates that aren't loaded yet
+        for key in template:
+            value = dict.__getitem__(template, key)
+            make, setter = _compile_field(value, self._convert)
+            self._makers.append((key, make))
+            self._setters[key] = setter
+            if isinstance(value, _LazyTemplate):
+                self._lazy.append(key)
+
+    def new(self):
+        '''A new typed tree holding the template defaults.
+
+        The tree remembers the template, so it pickles as the template and
+        the values that differ from it.
+        '''
+        out = dict.__new__(self._class)
+        object.__setattr__(out, '_readonly', False)
+        object.__setattr__(out, '_shared',
+                           set(self._lazy) if self._lazy else None)
+        object.__setattr__(out, '_convert', self._convert)
+        object.__setattr__(out, '_origin', self._template)
+        for key, make in self._makers:
+            dict.__setitem__(out, key, make())
+        return out
+
+    def apply(self, out, config, drop_unknown=False, drop_logger=None):
+        '''Update the typed tree `out` (made by this converter) in place'''
+        items = config.items() if isinstance(config, dict) else config
+        setters = self._setters
+        for key, value in items:
+            setter = setters.get(key)
+            if setter is None:
+                if not drop_unknown:
+                    raise KeyError(key)
+                if drop_logger is not None:
+                    drop_logger(key)
+                continue
+            setter(out, key, value, drop_unknown, drop_logger)
+
+    def __call__(self, config=None, drop_unknown=False, drop_logger=None):
+        out = self.new()
+        if config:
+            self.apply(out, config, drop_unknown, drop_logger)
+        return out
+
+
+_PRIMITIVES = (bool, int, float, str)
+
+
+def _compile_field(default, convert):
+    '''Return (make, setter) functions for one property of a template'''
+    kind = type(default)
+    if kind in _PRIMITIVES:
+        def make():
+            return default
+
+        def setter(out, key, value, drop_unknown, drop_logger):
+            if not isinstance(value, kind):
+                if not convert:
+                    raise TypeError("{} is not type {}".format(value, kind))
+                value = kind(value)
+            dict.__setitem__(out, key, value)
+    elif isinstance(default, TypedDict):
+        converter = compile_template(default)
+        make = converter.new
+
+        def setter(out, key, value, drop_unknown, drop_logger):
+            converter.apply(AttrDict._own(out, key), value, drop_unknown,
+                            drop_logger)
+    elif isinstance(default, _LazyTemplate):
+        # stays unloaded until the config sets something in it
+        def make():
+            return default
+
+        def setter(out, key, value, drop_unknown, drop_logger):
+            compile_template(default.load()).apply(
+                AttrDict._own(out, key), value, drop_unknown, drop_logger)
+    elif isinstance(default, TypedEnum):
+        def make():
+            return default.__copy__()
+
+        def setter(out, key, value, drop_unknown, drop_logger):
+            dict.__getitem__(out, key).__set__(None, value)
+    elif isinstance(default, TypedArray):
+        make = default.__deepcopy__
+
+        def setter(out, key, value, drop_unknown, drop_logger):
+            AttrDict._own(out, key).update(value)
+    elif isinstance(default, TypedList) and type(default) is TypedList:
+        def make():
+            new = TypedList(default._type, convert=default._convert,
+                            noset=default._noset)
+            list.extend(new, (v if type(v) in _PRIMITIVES else deepcopy(v)
+                              for v in list.__iter__(default)))
+            return new
+
+        def setter(out, key, value, drop_unknown, drop_logger):
+            AttrDict._own(out, key).update(value, drop_unknown=drop_unknown,
+                                           drop_logger=drop_logger)
+    else:
+        # anything else goes through the generic machinery
+        def make():
+            return deepcopy(default)
+
+        def setter(out, key, value, drop_unknown, drop_logger):
+            AttrDict.update(out, [(key, value)], drop_unknown=drop_unknown,
+                            drop_logger=drop_logger)
+    return make, setter
@@ -4,13 +4,108 @@ import time
 
 import requests
 
+from .properties import dumps, iterencode
+
 log = logging.getLogger(__name__)
 
 
+class Latency(object):
+    '''Round trip statistics of a connection, gathered by `REST.ping`.
+
+    Attributes:
+        samples (list of float): Seconds taken by every successful request.
+        failures (int): Number of requests that failed.
+        cold (float): Seconds taken by the first successful request, which
+            includes setting up the connection.
+        warm (float): Median of the remaining requests, which reuse the
+            connection of the first one.
+    '''
+    def __init__(self, samples, failures=0):
+        self.samples = list(samples)
+        self.failures = failures
+        self.cold = self.samples[0] if self.samples else None
+        rest = sorted(self.samples[1:]) or self.samples
+        self.warm = rest[len(rest) // 2] if rest else None
+
+    @property
+    def available(self):
+        '''True if the server answered at least once'''
+        return bool(self.samples)
+
+    @property
+    def reliability(self):
+        '''Fraction of requests that succeeded'''
+        total = len(self.samples) + self.failures
+        return len(self.samples) / total if total else 0.0
+
+    def percentile(self, percent):
+        '''Latency below which `percent` % of the samples fall'''
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = round(percent / 100 * (len(ordered) - 1))
+        return ordered[min(len(ordered) - 1, max(0, index))]
+
+    @property
+    def p50(self):
+        return self.percentile(50)
+
+    @property
+    def p90(self):
+        return self.percentile(90)
+
+    @property
+    def p99(self):
+        return self.percentile(99)
+
+    @property
+    def mean(self):
+        return sum(self.samples) / len(self.samples) if self.samples else None
+
+    @property
+    def timeout(self):
+        '''Suggested request timeout for quick calls, in seconds. None if
+        the server never answered'''
+        if not self.samples:
+            return None
+        return max(1.0, 10 * self.p99)
+
+    @property
+    def workers(self):
+        '''Suggested number of parallel requests for bulk operations.
+
+        Slow links benefit from more requests in flight; an unreliable
+        server gets fewer. None if the server never answered, so callers
+        keep their own default.
+        '''
+        if not self.samples:
+            return None
+        p50 = self.p50
+        workers = 4 if p50 < 0.02 else 8 if p50 < 0.2 else 16
+        if self.failures:
+            workers = max(1, int(workers * self.reliability) // 2)
+        return workers
+
+    def __repr__(self):
+        if not self.samples:
+            return 'Latency(available=False, failures={})'.format(
+                self.failures)
+        ms = lambda t: '{:.1f}ms'.format(t * 1000)
+        return ('Latency(p50={}, p90={}, p99={}, cold={}, warm={}, '
+                'failures={})'.format(ms(self.p50), ms(self.p90),
+                                      ms(self.p99), ms(self.cold),
+                                      ms(self.warm), self.failures))
+
+
 class REST(object):
     '''Object for making it easier to communicate with a rest object.
     Stores host, port and credential information and uses it automatically.
     '''
+    latency = None  # Latency of the last ping
+    patch_supported = None  # unknown until the first PATCH is attempted
+    bytes_sent = 0  # bytes of config sent by PUT and PATCH
+    bytes_saved = 0  # bytes not sent thanks to PATCH
+
     def __init__(self, host='127.0.0.1', port=8181, creds=None):
         self._host = host
         self._port = port
@@ -53,13 +148,96 @@ class REST(object):
             except ValueError:
                 return r.text
 
-    def _put(self, endpoint, config=None, timeout=None):
+    def ping(self, samples=5, timeout=5, endpoint='nio'):
+        '''Measure the round trip time to the server.
+
+        Keyword Arguments:
+            samples -- number of requests to make
+            timeout -- timeout of every request
+            endpoint -- cheap endpoint to request
+
+        All requests are made through one session, so after the first one
+        they reuse its connection. Returns a `Latency`, which is also kept
+        as `self.latency`
+        '''
+        times = []
+        failures = 0
+        url = self._url.format(endpoint)
+        with requests.Session() as session:
+            for _ in range(samples):
+                start = time.perf_counter()
+                try:
+                    r = session.get(url, auth=self._creds, timeout=timeout)
+                    r.raise_for_status()
+                except requests.exceptions.RequestException as e:
+                    log.warning("Ping failed: {}".format(e))
+                    failures += 1
+                else:
+                    times.append(time.perf_counter() - start)
+        self.latency = Latency(times, failures)
+        return self.latency
+
+    def _put(self, endpoint, config=None, timeout=None, stream=False):
+        '''PUTs a config, which can also be a properties tree or json text
+        that is already encoded.
+
+        Keyword Arguments:
+            stream -- send the body in chunks as it is encoded, instead of
+                encoding all of it first. Uses chunked transfer encoding.
+        '''
         config = config or {}
+        if isinstance(config, str):
+            data = config
+        elif stream:
+            def chunks():
+                for chunk in iterencode(config):
+                    chunk = chunk.encode()
+                    self.bytes_sent += len(chunk)
+                    yield chunk
+            data = chunks()
+        elif hasattr(config, '__basic__'):
+            data = dumps(config)
+        else:
+            data = json.dumps(config)
         r = requests.put(self._url.format(endpoint),
                          auth=self._creds,
-                         data=json.dumps(config),
+                         data=data,
                          timeout=timeout)
         r.raise_for_status()
+        if not stream:
+            self.bytes_sent += len(data)
+
+    def _patch(self, endpoint, patch, config, timeout=None):
+        '''Sends only the changed fields of a config.
+
+        `patch` is a JSON merge patch of `config`, which can be given like
+        for `_put`. If the server does not
+        support PATCH (405 or 501) the full `config` is PUT instead, and PATCH
+        is not attempted again. If the object no longer exists (404) it is
+        created again with a PUT. Other errors are raised.
+        '''
+        if self.patch_supported is False:
+            return self._put(endpoint, config, timeout)
+        data = json.dumps(patch)
+        r = requests.patch(self._url.format(endpoint),
+                           auth=self._creds,
+                           data=data,
+                           timeout=timeout)
+        if r.status_code in (405, 501):
+            log.info("Server does not support PATCH, using PUT")
+            self.patch_supported = False
+            return self._put(endpoint, config, timeout)
+        if r.status_code == 404:
+            log.info("{} does not exist, using PUT".format(endpoint))
+            return self._put(endpoint, config, timeout)
+        r.raise_for_status()
+        self.patch_supported = True
+        full = config if isinstance(config, str) else \
+            dumps(config) if hasattr(config, '__basic__') else json.dumps(config)
+        saved = len(full) - len(data)
+        self.bytes_sent += len(data)
+        self.bytes_saved += saved
+        log.debug("PATCH {} saved {} bytes".format(endpoint, saved))
 
     def _delete(self, endpoint, timeout=None):
         r = requests.delete(self._url.format(endpoint), auth=self._creds,
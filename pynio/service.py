@@ -1,5 +1,13 @@
+import json
+import time
 from copy import deepcopy
 from .block import Block
+from .graph import ExecutionGraph
+from .parallel import Coalescer
+from .properties import diff, dumps, compile_template
+
+# status requests for the same service are shared between threads
+_status_calls = Coalescer()
 
 
 class Service(object):
@@ -14,27 +22,46 @@ class Service(object):
     Attributes:
         name (str): Name of service.
         type (str): ServiceType of service.
-        config (dict): Configuration of service.
+        config (dict): Configuration of service. Its `execution` is
+            written from the connections of the service when it is read,
+            changes made to it are seen by later connections.
         status (str): Status of service.
 
     """
+    __slots__ = ('_name', '_type', '_config', '_graph', '_listed',
+                 '_changed', '_config_read', '_instance', '_saved',
+                 '_blocks')
 
     def __init__(self, name, type='Service', config=None, instance=None):
         if not name:
             raise ValueError("name cannot be blank")
         self._name = name
         self._type = type
+        self._graph = None
+        self._listed = None  # the execution of the config the graph matches
+        self._changed = False  # the graph changed since then
+        self._config_read = False  # the config was read since then
+        self._blocks = None  # (blocks map, version, resolved blocks)
         self.config = deepcopy(config) or {}
         self._instance = instance
+        self._saved = None  # (instance, config) of the last save
 
-    def save(self):
+    def save(self, validate=True):
         """PUTs the service config to nio.
 
         Will create a new service if one does not exist by this name.
-        Otherwise it will update the existing service config.
+        Otherwise it will update the existing service config. If the service
+        was already saved to this instance, only the fields that changed
+        since then are sent, and nothing if none did.
+
+        Args:
+            validate (bool, optional): Check the config locally first, see
+                `validate`. The service templates are loaded from the
+                instance the first time; if that fails nothing is checked.
 
         Raises:
             Exception: If service is not associated with an instance.
+            TypeError, ValueError: If the config is invalid, see `validate`.
 
         """
 
@@ -43,12 +70,119 @@ class Service(object):
         config = self.config
         config['name'] = self._name
         config['type'] = self._type
-        self._put('services/{}'.format(self._name), config)
+        if validate:
+            self.validate()
+        # reading the json back also copies the config for the next save
+        body = dumps(config)
+        data = json.loads(body)
+        endpoint = 'services/{}'.format(self._name)
+        saved = self._saved
+        if saved is None or saved[0] is not self._instance:
+            self._put(endpoint, body)
+        else:
+            patch = diff(saved[1], data)
+            if patch is None:
+                self._put(endpoint, body)
+            elif patch:
+                self._patch(endpoint, patch, body)
+        self._saved = (self._instance, data)
         self._instance.services[self._name] = self
 
+    @property
+    def template(self):
+        """The instance's shared template for this service type, if any."""
+        if not self._instance:
+            return None
+        return self._instance.services_types.get(self._type)
+
+    def validate(self):
+        """Check the config against the service template locally.
+
+        Keys the template doesn't know (like 'status') are ignored. The
+        config itself stays a plain dict and is not backed by the shared
+        template, a typed copy is only built here.
+
+        Returns:
+            Properties: A typed copy of the config, or None if there is no
+                template for this service type.
+
+        Raises:
+            TypeError, ValueError: If a value has the wrong type or is not
+                one of the options of a select.
+
+        """
+        template = self.template
+        if template is None:
+            return None
+        return compile_template(template)(self.config, drop_unknown=True)
+
     def _put(self, endpoint, config):
         self._instance._put(endpoint, config)
 
+    def _patch(self, endpoint, patch, config):
+        self._instance._patch(endpoint, patch, config)
+
+    def __deepcopy__(self, memo=None):
+        # the instance is only referenced, so it is shared
+        new = Service.__new__(type(self))
+        for attr in Service.__slots__:
+            object.__setattr__(new, attr, getattr(self, attr))
+        new._config = deepcopy(self.config, memo)
+        new._graph = None
+        new._blocks = None
+        return new
+
+    @property
+    def config(self):
+        graph = self._graph
+        if graph is not None:
+            if self._changed:
+                # connections are only written to the config when it is read
+                self._listed = self._config['execution'] = graph.execution()
+                self._changed = False
+            self._config_read = True  # the caller may change the execution
+        return self._config
+
+    @config.setter
+    def config(self, value):
+        self._config = value
+        self._graph = None
+        self._blocks = None
+
+    def _execution(self):
+        '''Return the execution graph, building it from config if needed.
+
+        The graph is built again if the execution of the config was replaced
+        or, after the config was read, changed.
+        '''
+        graph = self._graph
+        if graph is not None:
+            execution = self._config.get('execution')
+            if execution is not self._listed or (
+                    self._config_read and execution is not None and
+                    execution != graph.execution()):
+                graph = None
+            self._config_read = False
+        if graph is None:
+            execution = self._config.get('execution')
+            self._graph = graph = ExecutionGraph(execution or [])
+            self._listed = execution
+            self._changed = self._config_read = False
+            self._blocks = None
+        return graph
+
+    def _edit_execution(self):
+        '''Return the execution graph to change it'''
+        graph = self._execution()
+        self._changed = True
+        self._blocks = None
+        return graph
+
+    def __contains__(self, block):
+        """Whether a Block (or block name) is part of this service."""
+        return (block if isinstance(block, str) else block.name
+                ) in self._execution()
+
     def connect(self, blk1, blk2=None):
         """Connect two blocks.
 
@@ -58,35 +192,31 @@ class Service(object):
             blk2 (Block, optional): Receives signal form `blk1`.
 
         """
-        # initialize execution to an empty list if it doesn't already exist
-        execution = self.config.get('execution', [])
-        self.config['execution'] = execution
-        # check if source block is already in config
-        connection = None
-        for blk in execution:
-            if blk['name'] == blk1.name:
-                connection = blk
-                break
-        if blk2 is not None:
-            for blk in execution:
-                if blk['name'] == blk2.name:
-                    break
-            else:
-                # block2 doesn't exist, so add it
-                execution.append({'name': blk2.name, 'receivers': []})
-
-        # if block exists, add the receiever, otherwise init connection
-        receivers = [] if blk2 is None else [blk2.name]
-        if connection:
-            cr = connection['receivers']
-            cr.extend(receivers)
-            # remove duplicates but preserve order
-            seen = set()
-            seen_add = seen.add
-            cr[:] = [x for x in cr if not(x in seen or seen_add(x))]
+        self._connect(self._edit_execution(), blk1.name,
+                      None if blk2 is None else blk2.name)
+
+    def connect_many(self, connections):
+        """Connect many blocks at once.
+
+        Args:
+            connections (iterable): Pairs of (sender, receiver), where each
+                is a Block or a block name. A receiver of None adds the
+                sender with no receivers.
+
+        """
+        graph = self._edit_execution()
+        name = lambda b: b if b is None or isinstance(b, str) else b.name
+        for sender, receiver in connections:
+            self._connect(graph, name(sender), name(receiver))
+
+    @staticmethod
+    def _connect(graph, sender, receiver):
+        # new receivers are listed before new senders
+        if receiver is not None:
+            graph.add_node(receiver)
+            graph.add_edge(sender, receiver)
         else:
-            connection = {'name': blk1.name, 'receivers': receivers}
-            execution.append(connection)
+            graph.add_node(sender)
 
     def remove_block(self, block):
         """Remove a block from service. Does NOT delete the block.
@@ -95,31 +225,68 @@ class Service(object):
             block (Block): Block to remove from service.
 
         """
-        execution = self.config.get('execution', None)
-        if execution is None:  # no blocks
-            return
-        block = block._name
-
-        def clean(connection):
-            '''removes block from connection if it is in the list.
-            returns False if whole connection should be removed'''
-            if connection['name'] == block:
-                return False
-            try:
-                connection['receivers'].remove(block)
-            except ValueError:
-                pass
-            return True
-
-        execution[:] = [c for c in execution if clean(c)]
-
-    def start(self):
-        """Starts the nio Service."""
-        self.command('start')
-
-    def stop(self):
-        """Stops the nio Service."""
-        self.command('stop')
+        if self._graph is None and 'execution' not in self._config:
+            return  # no blocks
+        self._edit_execution().remove_node(block._name)
+
+    def topological_order(self):
+        """Return block names ordered so senders come before receivers.
+
+        Raises:
+            ValueError: If the blocks are connected in a cycle.
+
+        """
+        return self._execution().topological_order()
+
+    def levels(self):
+        """Group block names so every block only receives signals from
+        blocks of earlier groups. Blocks of one group can be handled in
+        parallel.
+
+        Raises:
+            ValueError: If the blocks are connected in a cycle.
+
+        """
+        return self._execution().levels()
+
+    def cycles(self):
+        """Return a list of the block names in every cycle."""
+        return self._execution().cycles()
+
+    def fan_in(self):
+        """Return the number of blocks sending to each block."""
+        return self._execution().fan_in()
+
+    def fan_out(self):
+        """Return the number of blocks each block sends to."""
+        return self._execution().fan_out()
+
+    def critical_path(self):
+        """Return the longest chain of block names.
+
+        Raises:
+            ValueError: If the blocks are connected in a cycle.
+
+        """
+        return self._execution().critical_path()
+
+    def start(self, **request_kwargs):
+        """Starts the nio Service.
+
+        Args:
+            request_kwargs: Keyword arguments are passed to http request.
+
+        """
+        return self.command('start', **request_kwargs)
+
+    def stop(self, **request_kwargs):
+        """Stops the nio Service.
+
+        Args:
+            request_kwargs: Keyword arguments are passed to http request.
+
+        """
+        return self.command('stop', **request_kwargs)
 
     def command(self, command, block=None, **request_kwargs):
         """Send a command to the service or to a block in the service.
@@ -160,18 +327,95 @@ class Service(object):
 
     @property
     def blocks(self):
-        """Return a list of blocks used by this service."""
+        """Return a list of blocks used by this service.
+
+        The list is cached until the service's connections or the blocks of
+        the instance change.
+
+        Raises:
+            TypeError: If service is not associated with an instance.
+            ValueError: If the service uses blocks the instance doesn't have.
+
+        """
+        blocks = self._instance_blocks()
+        self._execution()  # drops the cache if the execution was changed
+        version = getattr(blocks, 'version', None)
+        cache = self._blocks
+        if (cache is None or version is None or cache[0] is not blocks or
+                cache[1] != version):
+            cache = (blocks, version, list(self.iter_blocks()))
+            self._blocks = cache if version is not None else None
+        return list(cache[2])
+
+    def iter_blocks(self):
+        """Iterate over the blocks used by this service.
+
+        Blocks are looked up as they are iterated over. All block names are
+        checked before the iterator is returned.
+
+        Raises:
+            TypeError: If service is not associated with an instance.
+            ValueError: If the service uses blocks the instance doesn't have.
+
+        """
+        blocks = self._instance_blocks()
+        names = list(self._execution())
+        missing = [name for name in names if name not in blocks]
+        if missing:
+            raise ValueError("Service {} uses blocks that are not in the "
+                             "instance: {}".format(self._name, missing))
+        return (blocks[name] for name in names)
+
+    def _instance_blocks(self):
         if not self._instance:
             raise TypeError("Can only get block objects when attached to an "
                             "instance")
-        blocks = self._instance.blocks
-        return [blocks[i['name']] for i in self.config.get('execution', [])]
+        return self._instance.blocks
 
     def _status(self):
         """Returns the status of the Service."""
-        return self._instance._get(
+        return _status_calls.call(
+            (id(self._instance), self._name), self._instance._get,
             'services/{}/status'.format(self._name))
 
+    def wait_until(self, state, timeout=None, interval=0.1, max_interval=5,
+                   backoff=2):
+        """Block until the service reaches `state`.
+
+        The status is polled with exponential backoff, starting at
+        `interval` seconds and growing up to `max_interval` seconds.
+        Concurrent status requests for this service are shared.
+
+        Args:
+            state (str or list of str): Status (or statuses) to wait for,
+                e.g. 'started'.
+            timeout (float, optional): Maximum number of seconds to wait.
+                Default waits forever.
+
+        Returns:
+            str: The status that was reached.
+
+        Raises:
+            TimeoutError: If `state` was not reached within `timeout`.
+
+        """
+        states = {state} if isinstance(state, str) else set(state)
+        end = None if timeout is None else time.monotonic() + timeout
+        while True:
+            status = self.status
+            if status in states:
+                return status
+            wait = interval
+            if end is not None:
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(
+                        "Service {} is {}, not {} after {} seconds".format(
+                            self._name, status, state, timeout))
+                wait = min(wait, remaining)
+            time.sleep(wait)
+            interval = min(interval * backoff, max_interval)
+
     @property
     def name(self):
         return self._name
@@ -195,6 +439,7 @@ class Service(object):
             'services/{}'.format(self._name))
         self._instance.services.pop(self._name)
         self._instance = None  # make sure it isn't used anymore
+        self._saved = None  # saved again in full if it is added back
 
     @property
     def pid(self):
@@ -0,0 +1,219 @@
+import logging
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger(__name__)
+
+StatusChange = namedtuple('StatusChange', 'service old new time')
+StatusChange.__doc__ = '''A status transition of a service seen by a watcher.
+
+`old` and `new` are the status strings reported by nio and `time` is the
+`time.time()` the new status was observed at.
+'''
+
+
+class ServiceWatcher(object):
+    """Polls service statuses in the background and reports transitions.
+
+    Every service is polled on its own interval. The interval starts at
+    `min_interval` and is multiplied by `backoff` (up to `max_interval`)
+    every time the status is found unchanged, and is reset to
+    `min_interval` as soon as the status changes. Stable services
+    therefore cost very few requests while recently changed ones are
+    followed closely.
+
+    Transitions are passed to every registered callback and are also
+    queued so they can be consumed by iterating over the watcher.
+
+    Services asked for by name that the instance doesn't have are reported
+    with the status `MISSING` (see `statuses` and `missing`).
+
+    Args:
+        instance (Instance): Instance the services belong to.
+        services (list of Service or str, optional): Services to watch.
+            Default is every service of `instance`, including services that
+            are added while watching.
+        callbacks (list of callable, optional): Called with a
+            `StatusChange` for every transition.
+        min_interval (float, optional): Shortest poll interval in seconds.
+        max_interval (float, optional): Longest poll interval in seconds.
+        backoff (float, optional): Growth factor of the interval of a
+            service whose status did not change.
+        max_workers (int, optional): Maximum number of concurrent status
+            requests.
+        maxsize (int, optional): Number of transitions that can be queued
+            for iteration. Oldest transitions are dropped when full.
+
+    """
+    MISSING = 'missing'
+
+    def __init__(self, instance, services=None, callbacks=None,
+                 min_interval=0.5, max_interval=30, backoff=2, max_workers=4,
+                 maxsize=1000):
+        if min_interval <= 0 or max_interval < min_interval:
+            raise ValueError("Need 0 < min_interval <= max_interval")
+        if backoff < 1:
+            raise ValueError("backoff cannot be less than 1")
+        self._instance = instance
+        self._services = (None if services is None else
+                          [s if isinstance(s, str) else s.name
+                           for s in services])
+        self._callbacks = list(callbacks or [])
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.max_workers = max_workers
+        self._events = queue.Queue(maxsize)
+        self._state = {}  # name: [status, interval, due]
+        self._missing = set()  # watched names the instance doesn't have
+        self._lock = threading.Lock()  # guards _state and _missing
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_callback(self, callback):
+        """Register `callback` to be called with every `StatusChange`."""
+        self._callbacks.append(callback)
+
+    def remove_callback(self, callback):
+        self._callbacks.remove(callback)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def statuses(self):
+        """Last known status of every watched service."""
+        with self._lock:
+            out = {name: state[0] for (name, state) in self._state.items()}
+            out.update((name, self.MISSING) for name in self._missing)
+        return out
+
+    @property
+    def missing(self):
+        """Names of watched services the instance doesn't have."""
+        with self._lock:
+            return sorted(self._missing)
+
+    def start(self):
+        """Start polling in a background thread."""
+        if self.running:
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name='pynio-watch')
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Stop polling and wait up to `timeout` seconds for the thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def __iter__(self):
+        """Yield transitions as they happen until the watcher is stopped."""
+        while True:
+            try:
+                yield self._events.get(timeout=self.min_interval)
+            except queue.Empty:
+                if not self.running:
+                    return
+
+    def _watched(self):
+        '''Return the watched services and the names that are missing'''
+        services = self._instance.services
+        if self._services is None:
+            return dict(services), set()
+        return ({name: services[name] for name in self._services
+                 if name in services},
+                {name for name in self._services if name not in services})
+
+    def _due(self, now):
+        '''Return the services that need to be polled at `now`'''
+        watched, missing = self._watched()
+        with self._lock:
+            for name in missing - self._missing:
+                log.warning("Watched service {} is not in the "
+                            "instance".format(name))
+            self._missing = missing
+            for name in set(self._state) - set(watched):
+                del self._state[name]
+            return [s for (name, s) in watched.items()
+                    if name not in self._state or
+                    self._state[name][2] <= now]
+
+    def _poll(self, service):
+        try:
+            return service.status
+        except Exception as e:
+            log.warning("Could not get status of {}: {}".format(
+                service.name, e))
+            return e
+
+    def _update(self, service, status, now):
+        '''Record a polled status and reschedule the service.
+
+        The first status seen for a service is its baseline and is not
+        reported as a transition.
+        '''
+        change = None
+        with self._lock:
+            state = self._state.setdefault(service.name,
+                                           [None, self.min_interval, now])
+            old, interval = state[0], state[1]
+            if isinstance(status, Exception) or status == old:
+                interval = min(interval * self.backoff, self.max_interval)
+            else:
+                interval = self.min_interval
+                state[0] = status
+                if old is not None:
+                    change = StatusChange(service, old, status, time.time())
+            state[1] = interval
+            state[2] = now + interval
+        if change is not None:
+            self._emit(change)  # callbacks run without the lock
+
+    def _emit(self, change):
+        for callback in self._callbacks:
+            try:
+                callback(change)
+            except Exception:
+                log.exception("Watch callback failed")
+        try:
+            self._events.put_nowait(change)
+        except queue.Full:
+            self._events.get_nowait()
+            self._events.put_nowait(change)
+
+    def _step(self, executor):
+        '''Poll every due service once. Returns seconds until next poll'''
+        now = time.monotonic()
+        due = self._due(now)
+        for service, status in zip(due, executor.map(self._poll, due)):
+            self._update(service, status, time.monotonic())
+        with self._lock:
+            if not self._state:
+                return self.min_interval
+            due = min(s[2] for s in self._state.values())
+        return max(0, due - time.monotonic())
+
+    def _run(self):
+        with ThreadPoolExecutor(self.max_workers) as executor:
+            while not self._stop.is_set():
+                try:
+                    wait = self._step(executor)
+                except Exception:
+                    log.exception("Watching services failed")
+                    wait = self.min_interval
+                self._stop.wait(wait)
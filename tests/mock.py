@@ -1,5 +1,8 @@
 from unittest.mock import MagicMock
 from pynio import properties, Block, Instance
+from pynio.block import BlockMap
+from pynio.instance import load_service_type
+from .example_data import ServiceTemplate
 
 
 def throw(error):
@@ -55,15 +58,19 @@ def mock_instance(type=template):
         '_put'])()
     instance.droplog = MagicMock()
     instance._put = MagicMock()
+    instance._patch = MagicMock()
     instance._get = MagicMock()
     instance._delete = MagicMock()
-    instance.blocks = {}
+    instance.blocks = BlockMap()
     instance.services = {}
     b = Block('type', 'type', instance=instance)
     b._load_template('type', template)
     instance.blocks_types = {
         'type': b
     }
+    instance._services_types = {
+        'Service': load_service_type('Service', ServiceTemplate)
+    }
     return instance
 
 
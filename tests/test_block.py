@@ -1,8 +1,12 @@
+import json
+import threading
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 from copy import deepcopy
 
 from pynio import Block
+from pynio.block import BlockMap
+from pynio.properties import dumps
 from .mock import mock_instance, config, template
 
 
@@ -17,22 +21,68 @@ class TestBlock(unittest.TestCase):
         with self.assertRaises(ValueError):
             Block('', 'type')
 
-    def test_save(self):
+    @patch.object(Block, '_put')
+    def test_save(self, _put):
         b = Block('name', 'type', config)
         b._instance = mock_instance()
-        b._put = MagicMock()
         b.save()
         self.assertTrue(b._put.called)
         self.assertEqual(b._put.call_args[0][0], 'blocks/name')
-        self.assertDictEqual(b._put.call_args[0][1],
+        self.assertDictEqual(json.loads(b._put.call_args[0][1]),
                                 {'name': 'name',
                                 'type': 'type',
                                 'value': 0})
 
-    def test_save_with_no_instance(self):
+    def test_save_encoder(self):
+        '''the body is encoded from the typed config, not from a copy'''
+        instance = mock_instance()
+        b = Block('name', 'type', config, instance=instance)
+        with patch('pynio.block.dumps', wraps=dumps) as encode:
+            b.save()
+        encode.assert_called_once_with(b.config)
+        self.assertEqual(instance._put.call_args[0][1],
+                         json.dumps(b.json()))
+
+    def test_save_unchanged(self):
+        instance = mock_instance()
+        b = Block('name', 'type', config, instance=instance)
+        b.save()
+        typed = b.config
+        b.save()
+        self.assertEqual(instance._put.call_count, 1)
+        self.assertFalse(instance._patch.called)
+        self.assertIs(b.config, typed)  # template was not re-applied
+        b.config.value = 3
+        b.save()
+        self.assertEqual(instance._put.call_count, 1)
+        self.assertEqual(instance._patch.call_args[0][:2],
+                         ('blocks/name', {'value': 3}))
+        self.assertEqual(json.loads(instance._patch.call_args[0][2])['value'],
+                         3)
+        self.assertIs(b.config, typed)
+
+    def test_save_replaced_config(self):
+        instance = mock_instance()
+        b = Block('name', 'type', config, instance=instance)
+        b.save()
+        b.config = {'value': '5', 'unknown': 1}
+        b.save()
+        self.assertDictEqual(instance._patch.call_args[0][1], {'value': 5})
+        self.assertDictEqual(json.loads(instance._patch.call_args[0][2]),
+                             {'name': 'name', 'type': 'type', 'value': 5})
+
+    def test_save_other_instance(self):
+        in1, in2 = mock_instance(), mock_instance()
+        b = Block('name', 'type', config, instance=in1)
+        b.save()
+        b._instance = in2
+        b.save()
+        self.assertTrue(in2._put.called)
+
+    @patch.object(Block, '_put')
+    def test_save_with_no_instance(self, _put):
         b = Block('name', 'type')
         b._config = {'key': 'val'}
-        b._put = MagicMock()
         with self.assertRaises(Exception) as context:
             b.save()
         self.assertTrue('Block is not associated with an instance' in
@@ -125,6 +175,15 @@ class TestBlock(unittest.TestCase):
             {'name': 'two', 'receivers': []}
         ])
 
+    def test_delete_add_again(self):
+        instance = mock_instance()
+        b = instance.create_block('name', 'type')
+        b.delete()
+        instance._put.reset_mock()
+        instance.add_block(b)
+        self.assertEqual(instance._put.call_args[0][0], 'blocks/name')
+        self.assertFalse(instance._patch.called)
+
     def test_in_use(self):
         instance = mock_instance()
         s = instance.create_service('foo')
@@ -132,3 +191,23 @@ class TestBlock(unittest.TestCase):
         blk = s.create_block('one', 'type')
         use = blk.in_use()
         self.assertListEqual(use, [s])
+
+
+class TestBlockMap(unittest.TestCase):
+    def test_concurrent_version(self):
+        blocks = BlockMap()
+
+        def add(prefix):
+            for n in range(500):
+                blocks['{}{}'.format(prefix, n)] = object()
+        threads = [threading.Thread(target=add, args=(p,)) for p in 'abcd']
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(blocks.version, 2000)
+        copied = deepcopy(blocks)
+        self.assertIsInstance(copied, BlockMap)
+        self.assertEqual(len(copied), 2000)
+        copied['x'] = 1
+        self.assertEqual(copied.version, 1)
@@ -0,0 +1,93 @@
+import unittest
+
+from pynio.graph import ExecutionGraph
+
+execution = [
+    {'name': 'one', 'receivers': ['two', 'three']},
+    {'name': 'two', 'receivers': ['three']},
+    {'name': 'three', 'receivers': ['missing']},
+]
+
+
+class TestExecutionGraph(unittest.TestCase):
+    def test_round_trip(self):
+        graph = ExecutionGraph(execution)
+        self.assertEqual(graph.execution(), execution)
+        self.assertEqual(list(graph), ['one', 'two', 'three'])
+        self.assertNotIn('missing', graph)
+        self.assertEqual(len(graph), 3)
+
+    def test_execution_follows(self):
+        graph = ExecutionGraph(execution)
+        graph.add_edge('four', 'one')
+        graph.remove_edge('one', 'two')
+        graph.remove_node('three')
+        self.assertEqual(graph.execution(), [
+            {'name': 'one', 'receivers': []},
+            {'name': 'two', 'receivers': []},
+            {'name': 'four', 'receivers': ['one']},
+        ])
+        self.assertEqual(len(execution[0]['receivers']), 2)  # not changed
+
+    def test_edges(self):
+        graph = ExecutionGraph(execution)
+        self.assertEqual(graph.receivers('one'), ['two', 'three'])
+        self.assertEqual(graph.senders('three'), {'one', 'two'})
+        graph.add_edge('one', 'two')  # no duplicates
+        self.assertEqual(graph.receivers('one'), ['two', 'three'])
+        graph.remove_edge('one', 'three')
+        self.assertEqual(graph.senders('three'), {'two'})
+        self.assertEqual(graph.edges(), [('one', 'two'), ('two', 'three'),
+                                         ('three', 'missing')])
+
+    def test_remove_node(self):
+        graph = ExecutionGraph(execution)
+        graph.remove_node('three')
+        self.assertEqual(graph.execution(), [
+            {'name': 'one', 'receivers': ['two']},
+            {'name': 'two', 'receivers': []},
+        ])
+        self.assertEqual(graph.senders('missing'), set())
+        graph.remove_node('nothere')
+
+
+class TestAnalysis(unittest.TestCase):
+    def test_order(self):
+        graph = ExecutionGraph(execution)
+        self.assertEqual(graph.levels(), [['one'], ['two'], ['three']])
+        self.assertEqual(graph.topological_order(), ['one', 'two', 'three'])
+        self.assertEqual(graph.critical_path(), ['one', 'two', 'three'])
+        self.assertEqual(graph.cycles(), [])
+
+    def test_fan(self):
+        graph = ExecutionGraph(execution)
+        self.assertEqual(graph.fan_out(), {'one': 2, 'two': 1, 'three': 1})
+        self.assertEqual(graph.fan_in(), {'one': 0, 'two': 1, 'three': 2})
+
+    def test_cycles(self):
+        graph = ExecutionGraph(execution)
+        graph.add_edge('three', 'one')
+        graph.add_edge('four', 'four')
+        graph.add_edge('five', 'one')
+        self.assertEqual(graph.cycles(), [['one', 'two', 'three'], ['four']])
+        with self.assertRaises(ValueError):
+            graph.topological_order()
+        with self.assertRaises(ValueError):
+            graph.critical_path()
+
+    def test_critical_path(self):
+        graph = ExecutionGraph()
+        for sender, receiver in [('a', 'b'), ('b', 'c'), ('x', 'c'),
+                                 ('c', 'd'), ('a', 'd')]:
+            graph.add_node(receiver)
+            graph.add_edge(sender, receiver)
+        self.assertEqual(graph.critical_path(), ['a', 'b', 'c', 'd'])
+        self.assertEqual(graph.levels(), [['a', 'x'], ['b'], ['c'], ['d']])
+        self.assertEqual(ExecutionGraph().critical_path(), [])
+
+    def test_large(self):
+        graph = ExecutionGraph()
+        for n in range(20000):
+            graph.add_edge(n, n + 1)
+        self.assertEqual(len(graph.critical_path()), 20000)
+        self.assertEqual(graph.cycles(), [])
@@ -1,6 +1,8 @@
 from copy import deepcopy
 import unittest
+import requests
 from pynio import Instance, Block, Service
+from pynio.block import BlockMap
 from unittest.mock import MagicMock, patch
 from .mock import (mock_service, mock_instance, config, template, templates,
                    service_config, throw)
@@ -20,6 +22,8 @@ class MockInstance(Instance):
         self._get_blocks.return_value = {}, {}
         self._get_services = MagicMock()
         self._get_services.return_value = {}
+        self._get_services_types = MagicMock()
+        self._get_services_types.return_value = {}
         super().__init__(host, port, creds)
 
 
@@ -32,7 +36,7 @@ class TestInstance(unittest.TestCase):
 
     def test_add_block(self):
         i = MockInstance()
-        i.blocks_types = MagicMock()
+        i.blocks_types = mock_instance().blocks_types  # must be encodable
         i._put = MagicMock()
         name = 'name'
         self.assertTrue(name not in i.blocks)
@@ -72,6 +76,21 @@ class TestInstance(unittest.TestCase):
         self.assertEqual(get_called, get)
         self.assertEqual(delete_called, delete)
 
+    def test_reset_forgets_saves(self):
+        instance = mock_instance()
+        b = instance.create_block('name', 'type')
+        s = instance.create_service('name')
+        instance._get_blocks = MagicMock(
+            return_value=(instance.blocks_types, BlockMap()))
+        instance._get_services = MagicMock(return_value={})
+        instance.reset()  # like DELETE_ALL does
+        instance._put.reset_mock()
+        b.save()
+        s.save()
+        self.assertEqual([c[0][0] for c in instance._put.call_args_list],
+                         ['blocks/name', 'services/name'])
+        self.assertFalse(instance._patch.called)
+
     def test_create_block(self):
         instance = mock_instance()
         blk = instance.create_block('name', 'type')
@@ -165,6 +184,132 @@ class TestInstance(unittest.TestCase):
         self.assertDictEqual(s3.config, s4.config)
         assertInstanceEqual(self, in1, in2)
 
+    def test_start_stop_all(self):
+        instance = mock_instance()
+        for name in ('one', 'two', 'three'):
+            instance.create_service(name)
+        instance._get.reset_mock()
+        results = instance.start_all(timeout=5)
+        self.assertTrue(results.ok)
+        self.assertEqual(sorted(results), ['one', 'three', 'two'])
+        called = sorted(c[0][0] for c in instance._get.call_args_list)
+        self.assertEqual(called, ['services/one/start',
+                                  'services/three/start',
+                                  'services/two/start'])
+        self.assertEqual(instance._get.call_args[1], {'timeout': 5})
+
+        instance._get.reset_mock()
+        results = instance.stop_all(['one', instance.services['two']],
+                                    max_workers=1, depends={'two': ['one']})
+        self.assertEqual(sorted(results), ['one', 'two'])
+        called = [c[0][0] for c in instance._get.call_args_list]
+        self.assertEqual(called, ['services/two/stop', 'services/one/stop'])
+
+    def test_workers_from_latency(self):
+        from pynio.rest import Latency
+        instance = mock_instance()
+        self.assertEqual(instance._workers(None), 8)
+        instance.latency = Latency([0.5, 0.5])
+        self.assertEqual(instance._workers(None), 16)
+        self.assertEqual(instance._workers(2), 2)
+        instance.latency = Latency([], failures=5)  # keeps the default
+        self.assertEqual(instance._workers(None), 8)
+
+    def test_timeout_from_latency(self):
+        from pynio.rest import Latency
+        instance = mock_instance()
+        instance.create_service('one')
+        instance.start_all()
+        self.assertEqual(instance._get.call_args[1], {'timeout': None})
+        instance.latency = Latency([0.5, 0.5])
+        instance.stop_all()
+        self.assertEqual(instance._get.call_args[1], {'timeout': 5.0})
+        instance.restart_all(timeout=2)
+        self.assertEqual(instance._get.call_args[1], {'timeout': 2})
+        instance.latency = Latency([], failures=5)
+        instance.start_all()
+        self.assertEqual(instance._get.call_args[1], {'timeout': None})
+
+    def test_restart_all(self):
+        instance = mock_instance()
+        instance.create_service('one')
+        instance._get.side_effect = lambda endpoint, **kw: throw(ValueError)
+        results = instance.restart_all()
+        self.assertIsInstance(results.failed['one'], ValueError)
+        self.assertEqual(instance._get.call_count, 1)  # never started
+
+    def test_restart_all_order(self):
+        instance = mock_instance()
+        instance.create_service('one')
+        instance.create_service('two')
+        instance._get.reset_mock()
+        results = instance.restart_all(max_workers=1,
+                                       depends={'two': ['one']})
+        self.assertTrue(results.ok)
+        called = [c[0][0] for c in instance._get.call_args_list]
+        self.assertEqual(called, ['services/two/stop', 'services/one/stop',
+                                  'services/one/start', 'services/two/start'])
+
+    def test_clone_blocks(self):
+        instance = mock_instance()
+        proto = Block('proto', 'type', {'value': 7})
+        rows = ['one', {'name': 'two', 'value': '3', 'unknown': 0}]
+        results = instance.clone_blocks(proto, rows)
+        self.assertTrue(results.ok)
+        self.assertEqual(sorted(instance.blocks), ['one', 'two'])
+        self.assertIs(results['one'], instance.blocks['one'])
+        self.assertEqual(results['one'].json(),
+                         {'name': 'one', 'type': 'type', 'value': 7})
+        self.assertEqual(results['two'].json(),
+                         {'name': 'two', 'type': 'type', 'value': 3})
+        self.assertIs(results['two'].template,
+                      instance.blocks_types['type'].template)
+        self.assertEqual(instance._put.call_count, 2)
+        instance.droplog.assert_called_with('unknown')
+
+    def test_clone_blocks_invalid(self):
+        instance = mock_instance()
+        instance.create_block('one', 'type')
+        instance._put.reset_mock()
+        proto = Block('proto', 'type')
+        rows = ['one', {'name': 'two', 'value': 'bad'}, 'three']
+        with self.assertRaises(ValueError) as context:
+            instance.clone_blocks(proto, rows)
+        message = context.exception.args[0]
+        self.assertIn('one', message)
+        self.assertIn('two', message)
+        self.assertNotIn('three', message)
+        self.assertFalse(instance._put.called)
+        self.assertNotIn('three', instance.blocks)
+
+    def test_validate(self):
+        instance = mock_instance()
+        instance.create_block('existing', 'type')
+        good = Block('good', 'type', {'value': 1})
+        bad = Block('bad', 'type', {'value': 'x'})
+        unknown = Block('unknown', 'notatype')
+        service = Service('ser')
+        service.connect(good, Block('missing', 'type'))
+        service.connect(Block('existing', 'type'))
+        service.config['log_level'] = 'LOUD'
+        self.assertEqual(instance.validate([good]), [])
+        instance._put.reset_mock()
+        problems = instance.validate([good, bad, unknown], [service])
+        self.assertEqual(len(problems), 4)
+        self.assertTrue(problems[0].startswith('Block bad: invalid value'))
+        self.assertEqual(problems[1], 'Block unknown: unknown type notatype')
+        self.assertEqual(problems[2],
+                         "Service ser: unknown blocks ['missing']")
+        self.assertTrue(problems[3].startswith(
+            'Service ser: invalid log_level'))
+        self.assertFalse(instance._put.called)
+        self.assertFalse(instance._get.called)
+
+        receiver = Service('rec', config={'execution': [
+            {'name': 'good', 'receivers': ['ghost', 'existing']}]})
+        self.assertEqual(instance.validate([good], [receiver]),
+                         ["Service rec: unknown blocks ['ghost']"])
+
     def test_load_blocks(self):
         ins = mock_instance()
         configs = {}
@@ -182,6 +327,36 @@ class TestInstance(unittest.TestCase):
         [self.assertIsInstance(b, Block) for b in types.values()]
         self.assertDictEqual({n: b.json() for n, b in blocks.items()},
                               configs)
+        # loaded blocks share the template and are not saved when unchanged
+        ins.blocks_types = types
+        blocks['name1'].save()
+        self.assertIs(blocks['name1'].template, types['type'].template)
+        self.assertFalse(ins._put.called)
+
+    def test_load_services_types(self):
+        from .example_data import ServiceTemplate
+        ins = mock_instance()
+        ins._services_types = None
+        ins._get = MagicMock(return_value={'Service': ServiceTemplate})
+        types = ins.services_types
+        self.assertIs(ins.services_types, types)
+        self.assertEqual(ins._get.call_count, 1)
+        self.assertEqual(ins._get.call_args[0][0], 'services_types')
+        self.assertTrue(types['Service'].readonly)
+        self.assertEqual(types['Service'].type, 'Service')
+
+    def test_services_types_unavailable(self):
+        ins = mock_instance()
+        ins._services_types = None
+        ins._get = MagicMock(side_effect=requests.exceptions.ConnectionError)
+        service = Service('name', instance=ins)
+        service.save(validate=False)  # templates are not loaded
+        self.assertFalse(ins._get.called)
+        service.config['log_level'] = 'LOUD'
+        service.save()  # can't be validated
+        self.assertEqual(ins._patch.call_args[0][1], {'log_level': 'LOUD'})
+        self.assertEqual(ins.services_types, {})
+        self.assertEqual(ins._get.call_count, 1)
 
     def test_load_services(self):
         ins = mock_instance()
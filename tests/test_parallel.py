@@ -0,0 +1,133 @@
+import threading
+import time
+import unittest
+
+from pynio.parallel import Coalescer, Results, run, waves
+
+
+class Item():
+    def __init__(self, name):
+        self.name = name
+
+
+class TestWaves(unittest.TestCase):
+    def test_no_depends(self):
+        self.assertEqual(waves(['a', 'b']), [['a', 'b']])
+        self.assertEqual(waves([]), [])
+
+    def test_depends(self):
+        order = waves(['a', 'b', 'c', 'd'],
+                      {'b': ['a'], 'c': ['a', 'b'], 'x': ['a'], 'd': ['z']})
+        self.assertEqual(order, [['a', 'd'], ['b'], ['c']])
+
+    def test_cycle(self):
+        with self.assertRaises(ValueError):
+            waves(['a', 'b', 'c'], {'a': ['b'], 'b': ['a']})
+
+
+class TestRun(unittest.TestCase):
+    def test_results(self):
+        def func(item):
+            if item.name == 'bad':
+                raise ValueError(item.name)
+            return item.name * 2
+        results = run(func, [Item('a'), Item('bad')])
+        self.assertIsInstance(results, Results)
+        self.assertEqual(results['a'], 'aa')
+        self.assertIsInstance(results['bad'], ValueError)
+        self.assertEqual(results.succeeded, ['a'])
+        self.assertEqual(list(results.failed), ['bad'])
+        self.assertFalse(results.ok)
+        self.assertGreater(results.elapsed, 0)
+
+    def test_parallel(self):
+        lock = threading.Lock()
+        active = [0, 0]  # current, maximum
+
+        def func(item):
+            with lock:
+                active[0] += 1
+                active[1] = max(active)
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+        items = [Item(str(n)) for n in range(10)]
+        self.assertTrue(run(func, items, max_workers=3).ok)
+        self.assertEqual(active[1], 3)
+
+    def test_depends(self):
+        done = []
+
+        def func(item):
+            if item.name == 'bad':
+                raise ValueError
+            done.append(item.name)
+        items = [Item(n) for n in ('c', 'b', 'a', 'bad', 'after_bad')]
+        results = run(func, items, depends={'c': ['b'], 'b': ['a'],
+                                            'after_bad': ['bad']})
+        self.assertEqual(done, ['a', 'b', 'c'])
+        self.assertEqual(sorted(results.failed), ['after_bad', 'bad'])
+        self.assertIsInstance(results['after_bad'], RuntimeError)
+
+    def test_duplicate_names(self):
+        done = []
+        with self.assertRaises(ValueError):
+            run(done.append, [Item('a'), Item('b'), Item('a')])
+        self.assertEqual(done, [])
+
+
+class TestCoalescer(unittest.TestCase):
+    def test_shared(self):
+        coalescer = Coalescer()
+        calls = []
+        release = threading.Event()
+
+        def slow(value):
+            calls.append(value)
+            release.wait(1)
+            return value
+
+        results = []
+        threads = [threading.Thread(
+            target=lambda: results.append(coalescer.call('key', slow, 1)))
+            for _ in range(4)]
+        for t in threads:
+            t.start()
+        time.sleep(0.05)
+        release.set()
+        for t in threads:
+            t.join()
+        self.assertEqual(calls, [1])
+        self.assertEqual(results, [1] * 4)
+        # not shared once finished
+        self.assertEqual(coalescer.call('key', slow, 2), 2)
+        self.assertEqual(calls, [1, 2])
+
+    def test_copies(self):
+        coalescer = Coalescer()
+        release = threading.Event()
+
+        def slow():
+            release.wait(1)
+            return {'status': 'started'}
+
+        results = []
+        threads = [threading.Thread(
+            target=lambda: results.append(coalescer.call('key', slow)))
+            for _ in range(3)]
+        for t in threads:
+            t.start()
+        time.sleep(0.05)
+        release.set()
+        for t in threads:
+            t.join()
+        self.assertEqual(results, [{'status': 'started'}] * 3)
+        results[0]['status'] = 'stopped'
+        self.assertEqual(results[1], {'status': 'started'})
+        self.assertEqual(len({id(r) for r in results}), 3)
+
+    def test_exception(self):
+        coalescer = Coalescer()
+        with self.assertRaises(ValueError):
+            coalescer.call('key', int, 'bad')
+        self.assertEqual(coalescer.call('key', int, '3'), 3)
@@ -1,3 +1,6 @@
+from array import array
+import json
+import pickle
 from enum import Enum
 from copy import copy, deepcopy
 
@@ -10,7 +13,11 @@ from .mock import template, config
 
 from pynio.properties import (AttrDict, SolidDict,
                               TypedDict, TypedList, TypedEnum,
-                              load_block)
+                              load_block, diff, check, compile_template,
+                              TypedArray, TemplateCache, validate_batch,
+                              dumps, iterencode, fingerprint, schema_diff,
+                              interned_enum, templates, _LazyTemplate,
+                              TimeDelta, NioObject)
 
 mystr = 'abcdefg'
 mydict = dict(zip(mystr, range(len(mystr))))
@@ -48,6 +55,41 @@ class TestAttrDict(unittest.TestCase):
         self.assertNotEqual(attrdict.update, attrdict['update'])
         self.assertEqual(attrdict['update'], 'hi')
 
+    def test_missing(self):
+        attrdict = AttrDict(a=1)
+        self.assertRaises(AttributeError, getattr, attrdict, 'dne')
+        self.assertRaises(KeyError, attrdict.__getitem__, 'dne')
+        self.assertRaises(KeyError, attrdict.__getitem__, 'readonly')
+        assert attrdict.readonly is False
+
+    def test_subclass_attributes(self):
+        '''Subclasses without __slots__ can still have real attributes'''
+        class Loose(AttrDict):
+            pass
+        loose = Loose(a=1)
+        object.__setattr__(loose, 'extra', 2)
+        loose.extra = 3
+        self.assertEqual(loose.extra, 3)
+        self.assertNotIn('extra', loose)
+        self.assertEqual(loose.a, 1)
+
+    def test_attributes_added_later(self):
+        '''attributes added to classes after they were used are seen'''
+        class Slotted(AttrDict):
+            __slots__ = ()
+
+        class Value(object):
+            pass
+        attrdict = Slotted(a=1, value=Value())
+        self.assertIsInstance(attrdict.value, Value)
+        self.assertRaises(AttributeError, getattr, attrdict, 'extra')
+        Slotted.extra = property(lambda self: 'x')
+        self.assertEqual(attrdict.extra, 'x')
+        Value.__get__ = lambda self, obj: 5
+        self.assertEqual(attrdict.value, 5)
+        del Slotted.extra
+        self.assertRaises(AttributeError, getattr, attrdict, 'extra')
+
 # class TestSolid(unittest.TestCase):
 #     def test_basic(self):
 #         solid = SolidDict(mydict)
@@ -95,6 +137,64 @@ class TestTypedDict(unittest.TestCase):
         self.assertRaises(TypeError, setattr, frozen, 'own', TypedDict({}))
         self.assertRaises(TypeError, setattr, frozen, 'own', {})
 
+    def test_frozen(self):
+        template = load_block(SimulatorFastTemplate)
+        template.readonly = True
+        self.assertRaises(TypeError, setattr, template, 'log_level', 'DEBUG')
+        self.assertRaises(TypeError, setattr, template.interval, 'days', 3)
+        self.assertRaises(TypeError, template.attribute.value.__setitem__,
+                          'end', 3)
+        self.assertRaises(TypeError, template.pop, 'name')
+        self.assertRaises(TypeError, template.clear)
+        self.assertEqual(template.log_level, 'ERROR')
+        self.assertEqual(template.attribute.value.end, 1)
+        # hashable, by the fingerprint
+        other = load_block(SimulatorFastTemplate)
+        other.readonly = True
+        self.assertEqual({template: 1}[other], 1)
+        self.assertRaises(TypeError, hash, load_block(SimulatorFastTemplate))
+        # copies can be changed, the template still can't
+        config = compile_template(template)({'interval': {'days': 2}})
+        config.attribute.value.end = 4
+        copied = deepcopy(template)
+        copied.interval.days = 5
+        self.assertEqual(template.interval.days, 0)
+        # hashed trees stay read only
+        self.assertRaises(TypeError, setattr, template, 'readonly', False)
+        self.assertRaises(TypeError, setattr, template.interval, 'readonly',
+                          False)
+        self.assertEqual({template: 1}[other], 1)
+        unhashed = load_block(SimulatorFastTemplate)
+        unhashed.readonly = True
+        unhashed.readonly = False
+        unhashed.interval.days = 1
+        self.assertEqual(unhashed.attribute.value.end, 1)
+        self.assertRaises(TypeError, hash, unhashed)
+
+        # equal trees hash the same, the type is part of both
+        days = {'days': 1, 'seconds': 0}
+        delta, obj = TimeDelta(days), NioObject(days)
+        self.assertNotEqual(delta, obj)
+        self.assertEqual(delta, days)
+        delta.readonly = obj.readonly = True
+        self.assertNotEqual(delta, obj)
+        self.assertEqual(len({delta, obj}), 2)
+        same = TimeDelta(days)
+        same.readonly = True
+        self.assertEqual(delta, same)
+        self.assertEqual(hash(delta), hash(same))
+
+        values = TypedList(TypedDict({'a': 1}), [{'a': 2}])
+        values.readonly = True
+        self.assertRaises(TypeError, values.append, {'a': 3})
+        self.assertRaises(TypeError, values.pop)
+        self.assertRaises(TypeError, setattr, values[0], 'a', 3)
+        numbers = TypedList(int, [1, 2])
+        numbers.readonly = True
+        self.assertRaises(TypeError, numbers.extend, [3])
+        self.assertRaises(TypeError, numbers.sort)
+        self.assertEqual(deepcopy(numbers).readonly, False)
+
     def test_descriptor(self):
         venum = TypedEnum(abc)
         data = dict(mydict)
@@ -104,6 +204,60 @@ class TestTypedDict(unittest.TestCase):
         self.assertEqual(data.enum, 'b')
         self.assertRaises(ValueError, data.__setattr__, 'enum', 'z')
 
+    def test_deepcopy_independent(self):
+        '''Copies share nothing that either side can change'''
+        original = load_block(SimulatorFastTemplate)
+        interval = original.interval
+        copied = deepcopy(original)
+        interval.days = 5  # looked up before copying
+        self.assertEqual(copied.interval.days, 0)
+        self.assertIs(original.interval, interval)
+        interval.days = 0
+        copied.interval.days = 3
+        copied.attribute.value.end = 7
+        copied.log_level = 'DEBUG'
+        self.assertEqual(original.interval.days, 0)
+        self.assertEqual(original.attribute.value.end, 1)
+        self.assertEqual(original.log_level, 'ERROR')
+        original['interval']['seconds'] = 9
+        self.assertEqual(copied.interval.seconds, 1)
+        self.assertEqual(copied.interval.days, 3)
+        # values handed out by dict methods are owned as well
+        expected = original.__basic__()
+        third = deepcopy(original)
+        for value in third.values():
+            if isinstance(value, TypedDict):
+                value.clear()
+        self.assertEqual(original.__basic__(), expected)
+        third = deepcopy(original)
+        third.get('attribute').name = 'other'
+        self.assertEqual(original.attribute.name, 'sim')
+
+    def test_deepcopy_shared(self):
+        '''Copies of read only trees share nested values until written'''
+        template = load_block(SimulatorFastTemplate)
+        template.readonly = True
+        interval = template.interval
+        copied = deepcopy(template)
+        self.assertIs(dict.__getitem__(copied, 'interval'), interval)
+        self.assertFalse(copied.readonly)
+        copied.interval.days = 3
+        copied.attribute.value.end = 7
+        self.assertIsNot(dict.__getitem__(copied, 'interval'), interval)
+        self.assertEqual(template.interval.days, 0)
+        self.assertEqual(template.attribute.value.end, 1)
+        # shared values are read only for good
+        self.assertRaises(TypeError, setattr, interval, 'days', 5)
+        self.assertRaises(TypeError, setattr, interval, 'readonly', False)
+        other = deepcopy(template)
+        template.readonly = False
+        template.interval.days = 4
+        template.attribute.value.end = 2
+        self.assertEqual(other.interval.days, 0)
+        self.assertEqual(other.attribute.value.end, 1)
+        self.assertEqual(interval.days, 0)
+        self.assertEqual(copied.interval.days, 3)
+
 
 class TestTypedList(unittest.TestCase):
     def test_append(self):
@@ -129,6 +283,93 @@ class TestTypedList(unittest.TestCase):
         l[1] = 3.23423
         assert l[1] == 3
 
+    def test_deepcopy(self):
+        element = TypedDict({'a': 1})
+        l = TypedList(element, [{'a': 2}, {'a': 3}])
+        copied = deepcopy(l)
+        self.assertIs(copied._type, element)
+        copied[0].a = 5
+        copied.append({'a': 4})
+        self.assertEqual(l.__basic__(), [{'a': 2}, {'a': 3}])
+        self.assertEqual(copied.__basic__(), [{'a': 5}, {'a': 3}, {'a': 4}])
+
+
+class TestTypedArray(unittest.TestCase):
+    def test_list_semantics(self):
+        l = TypedList(int, [3, 1.5, '2'])
+        self.assertIsInstance(l, TypedArray)
+        self.assertIsInstance(l, list)
+        self.assertEqual(l, [3, 1, 2])
+        self.assertEqual(len(l), 3)
+        l.append('7')
+        l.extend(array('q', [8, 9]))
+        l.insert(0, 0)
+        l[1] = 4.2
+        l[2:4] = ['5', 6]
+        self.assertEqual(l, [0, 4, 5, 6, 7, 8, 9])
+        self.assertEqual(l[1:3], [4, 5])
+        self.assertEqual(l.pop(), 9)
+        del l[0]
+        l.sort(reverse=True)
+        self.assertEqual(list(l), [8, 7, 6, 5, 4])
+        self.assertIn(6, l)
+        self.assertEqual(l.index(6), 2)
+        self.assertRaises(ValueError, l.append, 'hello')
+        self.assertEqual(l, [8, 7, 6, 5, 4])  # failed appends change nothing
+        self.assertEqual(type(l.__basic__()), list)
+
+    def test_add(self):
+        l = TypedList(int, [1, 2])
+        self.assertEqual([0] + l, [0, 1, 2])
+        self.assertEqual(l + [3], [1, 2, 3])
+        self.assertEqual(l + TypedList(int, [3]), [1, 2, 3])
+        self.assertIs(type([0] + l), list)
+        self.assertRaises(TypeError, lambda: (0,) + l)
+        self.assertRaises(TypeError, lambda: l + (3,))
+        l += ['3', 4.0]
+        self.assertIsInstance(l, TypedArray)
+        self.assertEqual(l, [1, 2, 3, 4])
+        other = [0]
+        other += l
+        self.assertEqual(other, [0, 1, 2, 3, 4])
+        with self.assertRaises(TypeError):
+            l += 5
+        with self.assertRaises(TypeError):
+            l += '12'
+        self.assertEqual(l, [1, 2, 3, 4])
+
+    def test_bool_and_overflow(self):
+        flags = TypedList(bool, [1, 0, True])
+        self.assertEqual(flags.__basic__(), [True, False, True])
+        self.assertIs(flags[0], True)
+        self.assertEqual([type(f) for f in flags], [bool] * 3)
+        big = TypedList(int, [1])
+        big.append(2 ** 70)
+        self.assertEqual(big, [1, 2 ** 70])
+        self.assertEqual(big.__basic__(), [1, 2 ** 70])
+
+    def test_copies(self):
+        l = TypedList(float, [1, 2.5], noset=True)
+        for copied in (copy(l), deepcopy(l)):
+            copied.append(3)
+            self.assertEqual(l, [1.0, 2.5])
+            self.assertTrue(copied._noset)
+        self.assertRaises(IndexError, l.__setitem__, 0, 1)
+        source = array('d', [1.0])
+        l.update(source)
+        source.append(2.0)
+        self.assertEqual(l, [1.0])
+
+    def test_loaded(self):
+        t = deepcopy(template)
+        t['properties']['table'] = {'type': 'list', 'template': 'int',
+                                    'default': [1, 2]}
+        blk = load_block(t)
+        self.assertIsInstance(blk['table'], TypedArray)
+        typed = compile_template(blk)({'table': ['3', 4.0]})
+        self.assertEqual(typed.__basic__()['table'], [3, 4])
+        self.assertEqual(blk.__basic__()['table'], [1, 2])
+
 
 class TestTypedEnum(unittest.TestCase):
     def test_value_enum_only(self):
@@ -158,6 +399,47 @@ class TestTypedEnum(unittest.TestCase):
         self.assertEqual(venum.value, venum2.value)
         self.assertEqual(venum.value, 1)
 
+    def test_interned(self):
+        options = {'low': 0, 'high': 1}
+        self.assertIs(interned_enum(options), interned_enum(dict(options)))
+        self.assertIsNot(interned_enum(options),
+                         interned_enum({'high': 1, 'low': 0}))
+        first = dict.__getitem__(load_block(SimulatorFastTemplate),
+                                 'log_level')
+        second = dict.__getitem__(load_block(SimulatorFastTemplate),
+                                  'log_level')
+        self.assertIs(first._table, second._table)
+        first.value = 'DEBUG'
+        self.assertEqual(second.name, 'ERROR')
+
+    def test_unhashable_options(self):
+        options = {'pair': [1, 2], 'single': [3]}
+        enum = interned_enum(options)
+        self.assertIsNot(interned_enum(options), enum)  # not interned
+        value = TypedEnum(enum, 'single')
+        self.assertEqual(value.value, [3])
+        value.value = [1, 2]
+        self.assertEqual(value.name, 'pair')
+        self.assertRaises(ValueError, setattr, value, 'value', [4])
+        self.assertRaises(ValueError, setattr, value, 'value', 'other')
+        copied = pickle.loads(pickle.dumps(value))
+        self.assertEqual((copied.name, copied.value), ('pair', [1, 2]))
+
+    def test_bounded_caches(self):
+        from pynio import properties
+        size = properties._ENUM_CACHE_SIZE
+        properties._ENUM_CACHE_SIZE = 2
+        try:
+            enums = [interned_enum({'n': n}) for n in range(5)]
+            self.assertLessEqual(len(properties._interned_enums), 2)
+            values = [TypedEnum(e) for e in enums]
+            self.assertLessEqual(len(properties._enum_tables), 2)
+            self.assertIs(interned_enum({'n': 4}), enums[4])
+            copied = pickle.loads(pickle.dumps(values[0]))  # evicted
+            self.assertEqual(copied.value, 0)
+        finally:
+            properties._ENUM_CACHE_SIZE = size
+
 
 class TestLoadProperties(unittest.TestCase):
     def test_load_simple(self):
@@ -248,6 +530,67 @@ class TestLoadProperties(unittest.TestCase):
         config['interval']['days'] = 100
         self.assertEqual(config, blk.__basic__())
 
+    def test_lazy_object(self):
+        blk = load_block(SimulatorFastTemplate)
+        lazy = dict.__getitem__(blk, 'attribute')
+        self.assertNotIsInstance(lazy, AttrDict)
+        loaded = load_block(SimulatorFastTemplate)
+        loaded.items()  # loads every nested object
+        self.assertIsInstance(dict.__getitem__(loaded, 'attribute'), AttrDict)
+        self.assertEqual(blk.__basic__(), loaded.__basic__())
+        self.assertEqual(dumps(blk), dumps(loaded))
+        self.assertIsNone(lazy._loaded)  # still not loaded
+
+        copied = deepcopy(blk)
+        copied.attribute.value.end = 3
+        self.assertEqual(blk.attribute.value.end, 1)
+        self.assertIsInstance(dict.__getitem__(blk, 'attribute'), AttrDict)
+
+        typed = compile_template(load_block(SimulatorFastTemplate))(
+            {'attribute': {'name': 'other'}})
+        self.assertEqual(typed.attribute.name, 'other')
+        self.assertEqual(typed.attribute.value.end, 1)
+        self.assertRaises(ValueError, setattr, typed.attribute.value, 'end',
+                          'bad')
+
+    def test_lazy_iterated(self):
+        blk = load_block(SimulatorFastTemplate)
+        for value in blk.values():
+            self.assertNotIsInstance(value, _LazyTemplate)
+        for key, value in blk.items():
+            self.assertNotIsInstance(value, _LazyTemplate)
+
+        frozen = load_block(SimulatorFastTemplate)
+        frozen.readonly = True
+        raw = dict(dict.items(frozen))
+        for value in raw.values():
+            self.assertNotIsInstance(value, _LazyTemplate)
+        self.assertTrue(frozen.attribute.readonly)
+        self.assertEqual(frozen.__basic__(), blk.__basic__())
+        list(frozen.items())
+        frozen.attribute.value
+        for key, value in dict.items(frozen):
+            self.assertIs(value, raw[key])  # reading wrote nothing
+
+    def test_lazy_copied(self):
+        '''copies made by dict methods never get a placeholder'''
+        copies = (lambda t: t.copy(), dict, lambda t: {**t},
+                  lambda t: dict(t.items()))
+        self.assertEqual(AttrDict(load_block(SimulatorFastTemplate))
+                         ['attribute']['name'], 'sim')
+        for make in copies:
+            blk = load_block(SimulatorFastTemplate)
+            copied = make(blk)
+            self.assertEqual(copied['attribute']['name'], 'sim')
+            for value in dict.values(copied):
+                self.assertNotIsInstance(value, _LazyTemplate)
+        # read only values shared by a deepcopy are owned as well
+        template = load_block(SimulatorFastTemplate)
+        template.readonly = True
+        copied = dict(deepcopy(template))
+        copied['interval']['days'] = 3
+        self.assertEqual(template.interval.days, 0)
+
     def test_typecheck_simulator(self):
         blk = load_block(SimulatorFastTemplate)
         self.assertRaises(TypeError, setattr, blk.attribute.value.end, 'bad')
@@ -275,3 +618,280 @@ class TestLoadProperties(unittest.TestCase):
         c['attributes'] = [{'name': 'name', 'bad': 'foo', 'bad2': 'foo'}]
         droplog = MagicMock()
         blk.update(c, drop_unknown=True, drop_logger=droplog)
+
+
+class TestDiff(unittest.TestCase):
+    def test_diff(self):
+        old = {'a': 1, 'b': {'c': 2, 'd': 3}, 'e': [1, 2], 'f': 0}
+        new = {'a': 1, 'b': {'c': 2, 'd': 4}, 'e': [1, 2, 3], 'g': 5,
+               'f': False}
+        self.assertEqual(diff(old, new), {'b': {'d': 4}, 'e': [1, 2, 3],
+                                          'g': 5, 'f': False})
+        self.assertEqual(diff(new, new), {})
+        self.assertEqual(diff(new, {'a': 1}),
+                         {'b': None, 'e': None, 'g': None, 'f': None})
+
+    def test_diff_null(self):
+        # null deletes a field in a merge patch, so setting one can't be sent
+        old = {'a': 1, 'b': {'c': 2}, 'e': [1]}
+        self.assertIsNone(diff(old, {'a': None, 'b': {'c': 2}, 'e': [1]}))
+        self.assertIsNone(diff(old, {'a': 1, 'b': {'c': None}, 'e': [1]}))
+        self.assertIsNone(diff(old, {'a': 1, 'b': {'c': 2}, 'e': [1],
+                                     'n': {'x': None}}))
+        self.assertEqual(diff(old, {'a': 1, 'b': {'c': 2}, 'e': [None]}),
+                         {'e': [None]})
+
+
+class TestCheck(unittest.TestCase):
+    def test_check(self):
+        blk = load_block(SimulatorFastTemplate)
+        blk.readonly = True
+        config = deepcopy(SimulatorFastConfig)
+        self.assertEqual(check(blk, config), [])
+        config['log_level'] = 'LOUD'
+        config['interval'] = {'days': 'bad'}
+        config['unknown'] = 1
+        errors = check(blk, config)
+        self.assertEqual(sorted(key for key, _ in errors),
+                         ['interval', 'log_level'])
+        self.assertEqual(blk.log_level, 'ERROR')  # template is unchanged
+
+
+class TestValidateBatch(unittest.TestCase):
+    def test_batch(self):
+        blk = load_block(SimulatorFastTemplate)
+        blk.readonly = True
+        bad = deepcopy(SimulatorFastConfig)
+        bad['interval'] = {'days': 'bad'}
+        bad['unknown'] = 1
+        rows = (r for r in [SimulatorFastConfig, bad, 'row', {'name': 'x'}])
+        results = list(validate_batch(blk, rows, chunk_size=3))
+        self.assertEqual(len(results), 4)
+        config, errors = results[0]
+        self.assertEqual(errors, [])
+        self.assertEqual(config.__basic__(),
+                         compile_template(blk)(SimulatorFastConfig,
+                                               drop_unknown=True).__basic__())
+        self.assertIsNone(results[1][0])
+        self.assertEqual([key for key, _ in results[1][1]], ['interval'])
+        self.assertIsNone(results[2][0])
+        self.assertEqual(results[3][0].name, 'x')
+        strict = list(validate_batch(blk, [bad], drop_unknown=False))
+        self.assertEqual(sorted(key for key, _ in strict[0][1]),
+                         ['interval', 'unknown'])
+
+
+class TestCompiled(unittest.TestCase):
+    def test_all_configs(self):
+        '''compiled converters give the same trees as copy and update'''
+        from .example_data import BlocksTemplatesAll, BlocksConfigsAll
+        templates = {t: load_block(v) for (t, v) in BlocksTemplatesAll.items()}
+        for config in BlocksConfigsAll.values():
+            template = templates[config['type']]
+            expected = deepcopy(template)
+            expected.update(config, drop_unknown=True)
+            template.readonly = True
+            converter = compile_template(template)
+            self.assertIs(compile_template(template), converter)
+            result = converter(config, drop_unknown=True)
+            self.assertEqual(result.__basic__(), expected.__basic__())
+            self.assertIs(type(result), type(expected))
+            self.assertEqual(converter().__basic__(), template.__basic__())
+
+    def test_typed_result(self):
+        template = load_block(SimulatorFastTemplate)
+        config = compile_template(template)(SimulatorFastConfig)
+        config.interval.days = '3'
+        self.assertEqual(config.interval.days, 3)
+        self.assertRaises(ValueError, setattr, config, 'log_level', 'bad')
+        self.assertEqual(template.interval.days, 0)  # nothing is shared
+
+    def test_writable_not_cached(self):
+        template = load_block(SimulatorFastTemplate)
+        compile_template(template)
+        template.interval.days = 5
+        self.assertEqual(compile_template(template)().interval.days, 5)
+        template.readonly = True
+        self.assertIs(compile_template(template), compile_template(template))
+        template.readonly = False
+        self.assertIsNot(compile_template(template),
+                         compile_template(template))
+
+    def test_errors(self):
+        template = load_block(SimulatorFastTemplate)
+        converter = compile_template(template)
+        with self.assertRaises(KeyError):
+            converter({'unknown': 1})
+        with self.assertRaises(ValueError):
+            converter({'interval': {'days': 'bad'}})
+        with self.assertRaises(ValueError):
+            converter({'log_level': 'bad'})
+        droplog = MagicMock()
+        converter({'unknown': 1}, drop_unknown=True, drop_logger=droplog)
+        droplog.assert_called_once_with('unknown')
+
+
+class TestEncode(unittest.TestCase):
+    def test_example_configs(self):
+        from .example_data import BlocksTemplatesAll, BlocksConfigsAll
+        for config in BlocksConfigsAll.values():
+            blk = load_block(BlocksTemplatesAll[config['type']])
+            typed = compile_template(blk)(config, drop_unknown=True)
+            self.assertEqual(dumps(typed), json.dumps(typed.__basic__()))
+
+    def test_values(self):
+        tree = AttrDict({
+            'enum': TypedEnum(abc, 'b'),
+            'text': 'caf\xe9 "quoted"\n',
+            'numbers': TypedList(float, [1, float('nan'), float('inf')]),
+            'flags': TypedList(bool, [1, 0]),
+            'big': TypedList(int, [2 ** 70]),
+            'empty': TypedList(int),
+            'objects': TypedList(TypedDict({'a': 1}), [{'a': 2}, {}]),
+            'none': None, 'nested': {}, 'tuple': (1, 'a'),
+            1: 'int key', 2.5: 'float key', None: 'none key',
+        })
+        self.assertEqual(dumps(tree), json.dumps(tree.__basic__()))
+        self.assertRaises(TypeError, dumps, AttrDict(bad=object()))
+
+    def test_chunks(self):
+        tree = AttrDict(table=TypedList(int, range(10000)),
+                        rows=[{'x': i} for i in range(3000)])
+        chunks = list(iterencode(tree, chunk=1000))
+        self.assertGreater(len(chunks), 10)
+        self.assertEqual(''.join(chunks), json.dumps(tree.__basic__()))
+
+
+class TestSchema(unittest.TestCase):
+    def test_fingerprint(self):
+        first = load_block(SimulatorFastTemplate)
+        second = load_block(deepcopy(SimulatorFastTemplate))
+        self.assertEqual(fingerprint(first), fingerprint(second))
+        second.interval.days = 3
+        self.assertNotEqual(fingerprint(first), fingerprint(second))
+        first.readonly = True
+        self.assertIs(fingerprint(first), fingerprint(first))
+
+    def test_schema_diff(self):
+        raw = deepcopy(SimulatorFastTemplate)
+        props = raw['properties']
+        props['log_level']['options']['LOUD'] = 99
+        props['log_level']['default'] = 'INFO'
+        props['interval']['default']['days'] = 2
+        del props['signal_count']
+        props['new'] = {'type': 'int', 'default': 3}
+        props['attribute']['template']['name'] = {'type': 'int',
+                                                  'default': 0}
+        old = load_block(SimulatorFastTemplate)
+        new = load_block(raw)
+        self.assertEqual(schema_diff(old, old), [])
+        changes = {(c.path, c.change): c for c in schema_diff(old, new)}
+        self.assertEqual(sorted(changes), [
+            (('attribute', 'name'), 'retyped'),
+            (('interval', 'days'), 'default'),
+            (('log_level',), 'default'),
+            (('log_level',), 'options'),
+            (('new',), 'added'),
+            (('signal_count',), 'removed'),
+        ])
+        self.assertEqual(changes[('log_level',), 'default'][2:],
+                         ('ERROR', 'INFO'))
+        self.assertEqual(changes[('new',), 'added'].new, 'int')
+
+    def test_list_elements(self):
+        raw = deepcopy(template)
+        raw['properties']['rows'] = {
+            'type': 'list', 'default': [],
+            'template': {'a': {'type': 'int', 'default': 1}}}
+        old = load_block(raw)
+        raw['properties']['rows']['template']['a']['type'] = 'str'
+        raw['properties']['rows']['template']['a']['default'] = ''
+        change, = schema_diff(old, load_block(raw))
+        self.assertEqual(change.path, ('rows', '[]', 'a'))
+        self.assertEqual(change.change, 'retyped')
+
+
+class TestTemplateCache(unittest.TestCase):
+    def test_shared(self):
+        cache = TemplateCache()
+        first = cache.load(SimulatorFastTemplate, 'SimulatorFast', name='')
+        again = cache.load(deepcopy(SimulatorFastTemplate), 'SimulatorFast',
+                           name='')
+        self.assertIs(first, again)
+        self.assertTrue(first.readonly)
+        self.assertEqual(first.type, 'SimulatorFast')
+        self.assertIsNot(cache.load(SimulatorFastTemplate, 'Other'), first)
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 2))
+        self.assertEqual(stats['size'], 2)
+        self.assertGreater(stats['bytes'], 0)
+        # shared, so they stay read only; copies can be changed
+        self.assertRaises(TypeError, setattr, first, 'readonly', False)
+        copied = deepcopy(first)
+        copied.interval.days = 9
+        self.assertEqual(compile_template(first)().interval.days, 0)
+        self.assertEqual(cache.load(SimulatorFastTemplate, 'SimulatorFast',
+                                    name='').interval.days, 0)
+
+    def test_lru(self):
+        cache = TemplateCache(maxsize=2)
+        first = cache.load(SimulatorFastTemplate, 'a')
+        cache.load(SimulatorFastTemplate, 'b')
+        cache.load(SimulatorFastTemplate, 'a')  # now most recently used
+        cache.load(SimulatorFastTemplate, 'c')
+        self.assertEqual(len(cache), 2)
+        self.assertIs(cache.load(SimulatorFastTemplate, 'a'), first)
+        self.assertEqual(cache.stats()['hit_rate'], 2 / 5)
+
+    def test_fingerprints(self):
+        cache = TemplateCache()
+        template = load_block(SimulatorFastTemplate)
+        template.readonly = True
+        self.assertIsNone(cache.find(fingerprint(template)))
+        self.assertIs(cache.add(template), template)
+        other = load_block(SimulatorFastTemplate)
+        other.readonly = True
+        self.assertIs(cache.add(other), template)
+        self.assertIs(cache.find(fingerprint(other)), template)
+
+
+class TestPickle(unittest.TestCase):
+    def test_roundtrip(self):
+        blk = load_block(SimulatorFastTemplate)
+        blk.interval.days = 2
+        blk.log_level = 'DEBUG'
+        copied = pickle.loads(pickle.dumps(blk))
+        self.assertEqual(copied.__basic__(), blk.__basic__())
+        self.assertEqual(type(copied), type(blk))
+        # nested objects that were not used are still not loaded
+        self.assertIsNone(dict.__getitem__(copied, 'attribute')._loaded)
+        blk.readonly = True
+        self.assertTrue(pickle.loads(pickle.dumps(blk)).readonly)
+        enum = dict.__getitem__(copied, 'log_level')
+        self.assertIs(enum._table, dict.__getitem__(blk, 'log_level')._table)
+        self.assertRaises(ValueError, setattr, copied.interval, 'days', 'x')
+
+        values = TypedList(float, [1.5, 2])
+        self.assertEqual(pickle.loads(pickle.dumps(values)), values)
+        self.assertIsInstance(pickle.loads(pickle.dumps(values)), TypedArray)
+        attrs = AttrDict(a=1, b={'c': TypedEnum(abc, 'c')})
+        copied = pickle.loads(pickle.dumps(attrs))
+        self.assertEqual(copied.__basic__(), {'a': 1, 'b': {'c': 'c'}})
+
+    def test_template_and_config(self):
+        template = templates.load(SimulatorFastTemplate, 'SimulatorFast')
+        config = compile_template(template)({'interval': {'days': 3},
+                                             'log_level': 'DEBUG'})
+        copied = pickle.loads(pickle.dumps(config))
+        self.assertEqual(copied.__basic__(), config.__basic__())
+        # many configs only take the template once plus what they change
+        configs = [compile_template(template)({'interval': {'days': i}})
+                   for i in range(10)]
+        self.assertLess(len(pickle.dumps(configs)),
+                        len(pickle.dumps([deepcopy(c) for c in configs])))
+        # unpickled templates are shared by their fingerprint
+        template = pickle.loads(pickle.dumps(template))
+        self.assertIs(pickle.loads(pickle.dumps(template)), template)
+        copied.attribute.value.end = 4
+        self.assertEqual(pickle.loads(pickle.dumps(copied)).__basic__(),
+                         copied.__basic__())
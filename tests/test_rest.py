@@ -111,3 +111,104 @@ class TestREST(unittest.TestCase):
         r = rest.REST()
         value = r._get('foo')
         self.assertEqual(value, 'text')
+
+    @patch('requests.Session.get')
+    def test_ping(self, get):
+        get.return_value = mock_response()
+        r = rest.REST()
+        latency = r.ping(samples=4)
+        self.assertIs(r.latency, latency)
+        self.assertEqual(get.call_count, 4)
+        self.assertEqual(get.call_args[0][0], 'http://127.0.0.1:8181/nio')
+        self.assertTrue(latency.available)
+        self.assertEqual(len(latency.samples), 4)
+        self.assertEqual(latency.reliability, 1)
+        self.assertGreaterEqual(latency.timeout, 1)
+        self.assertEqual(latency.workers, 4)
+
+    @patch('requests.Session.get')
+    def test_ping_unavailable(self, get):
+        get.side_effect = requests.exceptions.ConnectionError
+        latency = rest.REST().ping(samples=2)
+        self.assertFalse(latency.available)
+        self.assertEqual(latency.failures, 2)
+        self.assertIsNone(latency.p50)
+        self.assertIsNone(latency.workers)
+
+    @patch('requests.put')
+    @patch('requests.patch')
+    def test_patch(self, patch_, put):
+        response = mock_response()
+        response.status_code = 200
+        patch_.return_value = response
+        r = rest.REST()
+        r._patch('end', {'a': 1}, {'a': 1, 'b': 'x' * 100})
+        self.assertEqual(patch_.call_args[1]['data'], '{"a": 1}')
+        self.assertFalse(put.called)
+        self.assertTrue(r.patch_supported)
+        self.assertEqual(r.bytes_sent, 8)
+        self.assertGreater(r.bytes_saved, 100)
+
+    @patch('requests.put')
+    @patch('requests.patch')
+    def test_patch_unsupported(self, patch_, put):
+        response = mock_response()
+        response.status_code = 405
+        patch_.return_value = response
+        r = rest.REST()
+        config = {'a': 1, 'b': 2}
+        r._patch('end', {'a': 1}, config)
+        r._patch('end', {'a': 1}, config)
+        self.assertEqual(patch_.call_count, 1)
+        self.assertEqual(put.call_count, 2)
+        self.assertEqual(put.call_args[1]['data'], json.dumps(config))
+        self.assertFalse(r.patch_supported)
+
+    @patch('requests.put')
+    @patch('requests.patch')
+    def test_patch_not_found(self, patch_, put):
+        response = mock_response()
+        response.status_code = 404
+        response.raise_for_status.side_effect = requests.exceptions.HTTPError
+        patch_.return_value = response
+        put.return_value = mock_response()
+        r = rest.REST()
+        r._patch('end', {'a': 1}, {'a': 1, 'b': 2})
+        self.assertEqual(put.call_args[1]['data'], '{"a": 1, "b": 2}')
+        self.assertIsNone(r.patch_supported)  # still unknown
+        response.status_code = 500
+        put.reset_mock()
+        with self.assertRaises(requests.exceptions.HTTPError):
+            r._patch('end', {'a': 1}, {'a': 1})
+        self.assertFalse(put.called)
+
+    @patch('requests.put')
+    def test_put_stream(self, put):
+        from pynio.properties import load_block
+        from .example_data import SimulatorFastTemplate
+        put.return_value = mock_response()
+        config = load_block(SimulatorFastTemplate)
+        r = rest.REST()
+        r._put('end', config)
+        self.assertEqual(put.call_args[1]['data'],
+                         json.dumps(config.__basic__()))
+        r._put('end', config, stream=True)
+        body = b''.join(put.call_args[1]['data'])
+        self.assertEqual(body, json.dumps(config.__basic__()).encode())
+        self.assertEqual(r.bytes_sent, 2 * len(body))
+        r._put('end', body.decode())  # already encoded
+        self.assertEqual(put.call_args[1]['data'], body.decode())
+
+
+class TestLatency(unittest.TestCase):
+    def test_stats(self):
+        latency = rest.Latency([0.5, 0.1, 0.3, 0.2, 0.4])
+        self.assertEqual(latency.cold, 0.5)
+        self.assertEqual(latency.warm, 0.3)
+        self.assertEqual(latency.p50, 0.3)
+        self.assertEqual(latency.p99, 0.5)
+        self.assertAlmostEqual(latency.mean, 0.3)
+        self.assertEqual(latency.workers, 16)
+        flaky = rest.Latency([0.01] * 3, failures=1)
+        self.assertEqual(flaky.reliability, 0.75)
+        self.assertEqual(flaky.workers, 1)
@@ -1,7 +1,9 @@
 from copy import deepcopy
+import json
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 from pynio.service import Service, Block
+from pynio.properties import dumps
 from .mock import mock_instance, config, template
 
 
@@ -179,3 +181,191 @@ class TestService(unittest.TestCase):
         s.connect(b1, b3)
         s.connect(b2, b3)
         str(s)  # verify no error is raised
+
+    @patch('time.sleep')
+    def test_wait_until(self, sleep):
+        instance = mock_instance()
+        s = instance.create_service('name')
+        statuses = iter(['stopped', 'starting', 'starting', 'started'])
+        instance._get = MagicMock(
+            side_effect=lambda e: {'status': next(statuses)})
+        self.assertEqual(s.wait_until('started', interval=1), 'started')
+        self.assertEqual(instance._get.call_args[0][0],
+                         'services/name/status')
+        self.assertEqual([c[0][0] for c in sleep.call_args_list], [1, 2, 4])
+
+    def test_wait_until_timeout(self):
+        instance = mock_instance()
+        s = instance.create_service('name')
+        instance._get = MagicMock(return_value={'status': 'stopped'})
+        with self.assertRaises(TimeoutError):
+            s.wait_until(['started', 'error'], timeout=0.05, interval=0.01)
+        self.assertGreater(instance._get.call_count, 1)
+
+    def test_wait_all(self):
+        instance = mock_instance()
+        instance.create_service('one')
+        instance.create_service('two')
+        instance._get = MagicMock(
+            side_effect=lambda e: {'status': 'started' if 'one' in e
+                                   else 'stopped'})
+        results = instance.wait_all(state='started', timeout=0.05,
+                                    interval=0.01)
+        self.assertEqual(results['one'], 'started')
+        self.assertIsInstance(results.failed['two'], TimeoutError)
+
+    def test_save_patch(self):
+        instance = mock_instance()
+        s = instance.create_service('name')
+        self.assertEqual(instance._put.call_count, 1)
+        s.save()
+        self.assertFalse(instance._patch.called)
+        s.connect(TestBlock('one'))
+        s.save()
+        self.assertEqual(instance._put.call_count, 1)
+        self.assertEqual(instance._patch.call_args[0][:2], (
+            'services/name',
+            {'execution': [{'name': 'one', 'receivers': []}]}))
+
+    def test_save_encoder(self):
+        instance = mock_instance()
+        s = Service('name', instance=instance)
+        with patch('pynio.service.dumps', wraps=dumps) as encode:
+            s.save()
+        encode.assert_called_once_with(s.config)
+        self.assertEqual(instance._put.call_args[0][1], json.dumps(s.config))
+
+    def test_save_null(self):
+        instance = mock_instance()
+        s = instance.create_service('name')
+        config = s.config
+        config['note'] = None  # a null in a merge patch deletes the field
+        s.config = config
+        s.save()
+        self.assertFalse(instance._patch.called)
+        self.assertEqual(instance._put.call_count, 2)
+        self.assertIsNone(json.loads(instance._put.call_args[0][1])['note'])
+
+    def test_delete_add_again(self):
+        instance = mock_instance()
+        s = instance.create_service('name')
+        s.delete()
+        instance._put.reset_mock()
+        instance.add_service(s)
+        self.assertEqual(instance._put.call_args[0][0], 'services/name')
+        self.assertFalse(instance._patch.called)
+
+    def test_connect_many(self):
+        s = Service('name')
+        s.connect(TestBlock('one'), TestBlock('two'))
+        s.connect_many([('two', 'three'), (TestBlock('one'), 'three'),
+                        ('four', None), ('one', 'two')])
+        self.assertEqual(s.config['execution'], [
+            {'name': 'two', 'receivers': ['three']},
+            {'name': 'one', 'receivers': ['two', 'three']},
+            {'name': 'three', 'receivers': []},
+            {'name': 'four', 'receivers': []},
+        ])
+
+    def test_config_edits(self):
+        '''changes made through config are kept by later connections'''
+        s = Service('name')
+        s.connect(TestBlock('one'), TestBlock('two'))
+        s.config['execution'].append({'name': 'three', 'receivers': []})
+        s.connect(TestBlock('three'), TestBlock('one'))
+        s.config = {'execution': [{'name': 'four', 'receivers': []}]}
+        s.connect(TestBlock('four'), TestBlock('one'))
+        self.assertEqual(s.config['execution'], [
+            {'name': 'four', 'receivers': ['one']},
+            {'name': 'one', 'receivers': []},
+        ])
+
+    def test_execution_replaced(self):
+        '''an execution assigned after the graph was built is used'''
+        instance = mock_instance()
+        s = instance.create_service('name')
+        one = instance.create_block('one', 'type')
+        instance.create_block('two', 'type')
+        s.connect(one)
+        self.assertEqual([b.name for b in s.blocks], ['one'])
+        s.config['execution'] = [{'name': 'two', 'receivers': []}]
+        self.assertEqual([b.name for b in s.blocks], ['two'])
+        s.connect(one)
+        self.assertEqual(s.config['execution'], [
+            {'name': 'two', 'receivers': []},
+            {'name': 'one', 'receivers': []},
+        ])
+        graph = s._graph
+        s.config['execution'][0]['receivers'].append('one')
+        self.assertEqual(s.fan_in(), {'two': 0, 'one': 1})
+        self.assertIsNot(s._graph, graph)
+
+    def test_remove_block_no_execution(self):
+        s = Service('name')
+        s.remove_block(TestBlock('one'))
+        self.assertNotIn('execution', s.config)
+
+    def test_analysis(self):
+        s = Service('name')
+        s.connect_many([('one', 'two'), ('two', 'three'), ('one', 'three')])
+        self.assertEqual(s.topological_order(), ['one', 'two', 'three'])
+        self.assertEqual(s.levels(), [['one'], ['two'], ['three']])
+        self.assertEqual(s.critical_path(), ['one', 'two', 'three'])
+        self.assertEqual(s.fan_out(), {'one': 2, 'two': 1, 'three': 0})
+        self.assertEqual(s.fan_in(), {'one': 0, 'two': 1, 'three': 2})
+        self.assertEqual(s.cycles(), [])
+
+    def test_blocks_cached(self):
+        instance = mock_instance()
+        s = instance.create_service('name')
+        one = s.create_block('one', 'type')
+        two = s.create_block('two', 'type')
+        self.assertEqual(s.blocks, [one, two])
+        cache = s._blocks
+        self.assertEqual(s.blocks, [one, two])
+        self.assertIs(s._blocks, cache)
+        s.config['log_level'] = 'INFO'  # reading the config keeps it
+        self.assertIs(s._blocks, cache)
+        # replacing a block in the instance invalidates the cache
+        new_two = instance.add_block(two, overwrite=True)
+        self.assertEqual(s.blocks, [one, new_two])
+        # so do connections
+        three = instance.create_block('three', 'type')
+        s.connect(one, three)
+        self.assertEqual(s.blocks, [one, new_two, three])
+        s.remove_block(one)
+        self.assertEqual(list(s.iter_blocks()), [new_two, three])
+        three.delete()
+        self.assertEqual(s.blocks, [new_two])
+        self.assertEqual(new_two.in_use(), [s])
+        self.assertIn('two', s)
+        self.assertNotIn(one, s)
+
+    def test_blocks_missing(self):
+        instance = mock_instance()
+        s = instance.create_service('name')
+        s.connect(TestBlock('missing'), TestBlock('gone'))
+        s.create_block('one', 'type')
+        with self.assertRaises(ValueError) as context:
+            s.iter_blocks()
+        self.assertIn("['gone', 'missing']", context.exception.args[0])
+        with self.assertRaises(ValueError):
+            s.blocks
+
+    def test_validate(self):
+        instance = mock_instance()
+        s = instance.create_service('name')
+        s.connect(TestBlock('one'), TestBlock('two'))
+        s.config['status'] = 'started'
+        typed = s.validate()
+        self.assertEqual(typed.log_level, 'ERROR')
+        self.assertEqual(typed['execution'][1].receivers, ['two'])
+        self.assertIs(s.template, instance.services_types['Service'])
+        instance._put.reset_mock()
+        s.config['log_level'] = 'LOUD'
+        with self.assertRaises(ValueError):
+            s.save()
+        self.assertFalse(instance._put.called)
+        self.assertFalse(instance._patch.called)
+        other = Service('other', 'Other', instance=instance)
+        self.assertIsNone(other.validate())
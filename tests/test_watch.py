@@ -0,0 +1,105 @@
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from pynio.watch import ServiceWatcher, StatusChange
+from .mock import mock_instance
+
+
+class StatusService():
+    '''Service whose status follows a list of values'''
+    def __init__(self, name, statuses):
+        self.name = name
+        self._statuses = list(statuses)
+        self.polls = 0
+
+    @property
+    def status(self):
+        self.polls += 1
+        if len(self._statuses) > 1:
+            return self._statuses.pop(0)
+        return self._statuses[0]
+
+
+def wait_for(condition, timeout=2):
+    end = time.monotonic() + timeout
+    while not condition() and time.monotonic() < end:
+        time.sleep(0.005)
+
+
+class TestServiceWatcher(unittest.TestCase):
+    def watch(self, *services, **kwargs):
+        instance = mock_instance()
+        instance.services = {s.name: s for s in services}
+        kwargs.setdefault('min_interval', 0.01)
+        kwargs.setdefault('max_interval', 0.05)
+        return instance, ServiceWatcher(instance, **kwargs)
+
+    def test_transitions(self):
+        s = StatusService('one', ['started', 'started', 'stopped'])
+        callback = MagicMock()
+        _, watcher = self.watch(s, callbacks=[callback])
+        with watcher:
+            wait_for(lambda: callback.called)
+        self.assertEqual(callback.call_count, 1)
+        change = callback.call_args[0][0]
+        self.assertIsInstance(change, StatusChange)
+        self.assertIs(change.service, s)
+        self.assertEqual((change.old, change.new), ('started', 'stopped'))
+        self.assertEqual(list(watcher), [change])
+        self.assertEqual(watcher.statuses, {'one': 'stopped'})
+
+    def test_backoff(self):
+        s = StatusService('one', ['started'])
+        _, watcher = self.watch(s, min_interval=0.01, max_interval=10)
+        now = time.monotonic()
+        watcher._update(s, 'started', now)
+        self.assertEqual(watcher._state['one'][1], 0.01)
+        watcher._update(s, 'started', now)
+        watcher._update(s, 'started', now)
+        self.assertEqual(watcher._state['one'][1], 0.04)
+        watcher._update(s, 'stopped', now)
+        self.assertEqual(watcher._state['one'][1], 0.01)
+        self.assertEqual(watcher._state['one'][2], now + 0.01)
+
+    def test_errors_back_off(self):
+        s = StatusService('one', ['started'])
+        _, watcher = self.watch(s, min_interval=1, max_interval=10)
+        now = time.monotonic()
+        watcher._update(s, ValueError(), now)
+        watcher._update(s, ValueError(), now)
+        self.assertEqual(watcher.statuses, {'one': None})
+        self.assertEqual(watcher._state['one'][1], 4)
+        watcher._update(s, 'started', now)  # baseline, not a transition
+        self.assertTrue(watcher._events.empty())
+
+    def test_subset(self):
+        one = StatusService('one', ['started'])
+        two = StatusService('two', ['started'])
+        instance, watcher = self.watch(one, two, services=['two'])
+        with watcher:
+            wait_for(lambda: two.polls > 2)
+        self.assertEqual(one.polls, 0)
+
+    def test_missing(self):
+        one = StatusService('one', ['started'])
+        _, watcher = self.watch(one, services=['one', 'gone'])
+        with watcher:
+            wait_for(lambda: one.polls > 1)
+        self.assertEqual(watcher.missing, ['gone'])
+        self.assertEqual(watcher.statuses,
+                         {'one': 'started', 'gone': ServiceWatcher.MISSING})
+
+    def test_instance_watch(self):
+        s = StatusService('one', ['started', 'error'])
+        instance = mock_instance()
+        instance.services = {'one': s}
+        callback = MagicMock()
+        watcher = instance.watch(callback=callback, min_interval=0.01)
+        try:
+            self.assertTrue(watcher.running)
+            wait_for(lambda: callback.called)
+        finally:
+            watcher.stop()
+        self.assertFalse(watcher.running)
+        self.assertEqual(callback.call_args[0][0].new, 'error')